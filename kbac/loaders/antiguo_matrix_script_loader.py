@@ -1,5 +1,8 @@
 import regex
-import joblib
+import sys
+import hashlib
+
+from dataclasses import dataclass
 
 from tqdm import tqdm
 from itertools import groupby
@@ -7,11 +10,20 @@ from more_itertools import flatten
 from pypdf import PdfReader, PageObject
 
 from typing import Literal
-from pydantic import BaseModel, NonNegativeInt, PositiveInt, StrictStr, Field
+from pydantic import BaseModel, StrictStr
+
+# Mismo parser lineal de ubicaciones que el loader actual
+from .matrix_script_loader import _match_location
+
 
+# Patrones precompilados: se evalúan en cada línea del guion
+_PAREN_RE = regex.compile(r"\(.*\)")
 
-class LineItem(BaseModel):
-    page_number: NonNegativeInt
+
+# Se construye una instancia por línea del guion: sin validación Pydantic en este camino
+@dataclass(slots=True)
+class LineItem:
+    page_number: int
     text_type: Literal[
         "location",
         "description",
@@ -19,8 +31,8 @@ class LineItem(BaseModel):
         "dialog",
         "raw"
     ]
-    text: StrictStr = Field(min_length=1)
-    margin: PositiveInt
+    text: str
+    margin: int
 
 
 class Document(BaseModel):
@@ -59,70 +71,69 @@ class MatrixScriptLoader:
         self.start_page = start_page
         self.end_page = end_page
         self.show_no_matched_texts = show_no_matched_texts
+        # Una sola alternancia compilada evita recorrer la línea una vez por etiqueta
+        self._ignore_re = (
+            regex.compile("|".join(regex.escape(tag) for tag in ignoread_tags))
+            if ignoread_tags
+            else None
+        )
 
     def _get_location_text(self, line_text: str):
-        if not line_text.isupper():
-            return None, None
-        match_ = regex.match(r"([AB]?\d+\s{2,})(.*?)(\s{2,}[AB]?\d+$)", line_text)
+        match_ = _match_location(line_text)
         if match_ is None:
             return None, None
-        groups = match_.groups()
-        margin = len(groups[0])
+        location_text, margin = match_
         if margin not in self.location_margins:
             return None, None
-        return groups[1].strip(), margin
+        return location_text.strip(), margin
 
-    def _get_character_text(self, line_text: str):
-        if not line_text.isupper():
-            return None, None
-        match_ = regex.match(r"(\s{2,})(.*)", line_text)
-        if match_ is None:
+    def _get_character_text(self, body: str, margin: int):
+        if margin < 2:
             return None, None
-        groups = match_.groups()
-        margin = len(groups[0])
         if margin not in self.character_margins:
             return None, None
-        character_text = groups[1]
-        character_text = regex.sub(r"\(.*\)", "", character_text)
+        character_text = _PAREN_RE.sub("", body)
         character_text = character_text.strip()
         return character_text, margin
 
-    def _get_non_upper_text(self, line_text: str, margins: set[int]):
-        match_ = regex.match(r"(\s{2,})(.*)", line_text)
-        if match_ is None:
+    def _get_non_upper_text(self, body: str, margin: int, margins: set[int]):
+        if margin < 2:
             return None, None
-        groups = match_.groups()
-        margin = len(groups[0])
         if margin not in margins:
             return None, None
-        return groups[1].strip(), margin
+        return body.rstrip(), margin
 
-    def _get_description_text(self, line_text: str):
-        return self._get_non_upper_text(line_text, margins=self.description_margins)
+    def _get_description_text(self, body: str, margin: int):
+        return self._get_non_upper_text(body, margin, margins=self.description_margins)
 
-    def _get_dialog_text(self, line_text: str):
-        return self._get_non_upper_text(line_text, margins=self.dialog_margins)
+    def _get_dialog_text(self, body: str, margin: int):
+        return self._get_non_upper_text(body, margin, margins=self.dialog_margins)
 
     def _parse_page_line(self, line_text: str, page_number: int) -> LineItem | None:
-        if any(it in line_text for it in self.ignoread_tags):
+        if self._ignore_re is not None and self._ignore_re.search(line_text):
             return None
-        location_text, location_margin = self._get_location_text(line_text)
-        if location_text is not None and location_margin is not None:
-            return LineItem(
-                page_number=page_number,
-                text_type="location",
-                text=location_text,
-                margin=location_margin,
-            )
-        character_text, character_margin = self._get_character_text(line_text)
-        if character_text is not None and character_margin is not None:
-            return LineItem(
-                page_number=page_number,
-                text_type="character",
-                text=character_text,
-                margin=character_margin,
-            )
-        description_text, description_margin = self._get_description_text(line_text)
+        # Mayúsculas e indentación se calculan una sola vez y se comparten con los helpers
+        is_upper = line_text.isupper()
+        body = line_text.lstrip()
+        indent = len(line_text) - len(body)
+        if is_upper:
+            location_text, location_margin = self._get_location_text(line_text)
+            if location_text is not None and location_margin is not None:
+                return LineItem(
+                    page_number=page_number,
+                    text_type="location",
+                    text=location_text,
+                    margin=location_margin,
+                )
+            character_text, character_margin = self._get_character_text(body, indent)
+            if character_text is not None and character_margin is not None:
+                return LineItem(
+                    page_number=page_number,
+                    text_type="character",
+                    text=character_text,
+                    margin=character_margin,
+                )
+        description_text, description_margin = self._get_description_text(body, indent)
         if description_text is not None and description_margin is not None:
             return LineItem(
                 page_number=page_number,
@@ -130,7 +141,7 @@ class MatrixScriptLoader:
                 text=description_text,
                 margin=description_margin,
             )
-        dialog_text, dialog_margin = self._get_dialog_text(line_text)
+        dialog_text, dialog_margin = self._get_dialog_text(body, indent)
         if dialog_text is not None and dialog_margin is not None:
             return LineItem(
                 page_number=page_number,
@@ -145,7 +156,7 @@ class MatrixScriptLoader:
                 page_number=page_number,
                 text_type="raw",
                 text=no_matched_text,
-                margin=1,  # Siempre positivo para cumplir con Pydantic
+                margin=1,
             )
         return None
 
@@ -164,7 +175,7 @@ class MatrixScriptLoader:
                 line_text=line_text,
                 page_number=page_number,
             )
-            for line_text in page_text.split("\n")
+            for line_text in page_text.splitlines()
         )
         return [li for li in line_items if li is not None]
 
@@ -181,22 +192,24 @@ class MatrixScriptLoader:
                 total=reader.get_num_pages(),
             ),
         )
-        line_items = list(flatten(parsed_pages))
         documents = []
         location = None
         character = None
         scene_description_id = None
-        for idx, li in enumerate(line_items, start=1):
+        for idx, li in enumerate(flatten(parsed_pages), start=1):
             text = li.text
             text_type = li.text_type
+            # Ubicaciones y personajes se repiten en los metadatos: se comparte una única copia
             if text_type == "location":
-                location = text
+                location = sys.intern(text)
                 continue
             if text_type == "character":
-                character = text
+                character = sys.intern(text)
                 continue
             if text_type == "description":
-                scene_description_id = joblib.hash(text)
+                scene_description_id = hashlib.blake2b(
+                    text.encode("utf-8"), digest_size=16
+                ).hexdigest()
                 documents.append(
                     Document(
                         text=text,
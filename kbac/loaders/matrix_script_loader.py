@@ -1,20 +1,152 @@
+import math
+import mmap
+import multiprocessing
 import regex
+import statistics
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from tqdm import tqdm
 from more_itertools import flatten
 from pypdf import PdfReader, PageObject
-from typing import Literal, Optional
-from pydantic import BaseModel, NonNegativeInt, PositiveInt, StrictStr, Field
+from typing import Any, Iterator, Literal, Optional, TypedDict
 
-class LineItem(BaseModel):
-    page_number: NonNegativeInt
+try:
+    import pymupdf
+except ImportError:  # PyMuPDF es opcional: sin él se extrae el texto con pypdf
+    pymupdf = None
+
+# Patrones precompilados: se evalúan en cada línea del guion
+_PAREN_RE = regex.compile(r"\(.*\)")
+
+# Márgenes (en columnas de texto) calibrados para el layout que produce cada backend
+_DEFAULT_MARGINS = {
+    "pypdf": {"location": {8, 9}, "description": {8, 9}, "dialog": {21, 30}, "character": {32, 38, 39}},
+    "pymupdf": {"location": {7}, "description": {7}, "dialog": {17, 24}, "character": {31}},
+}
+
+# Borde izquierdo de la página (1 pulgada) y ancho del glifo de Courier (0,6 em)
+_PAGE_LEFT_EDGE = 72.0
+_COURIER_PITCH = 0.6
+
+# El guion no asocia Unicode al glifo del espacio de no separación: pypdf emite su nombre y
+# PyMuPDF (sin sustituir por el código del glifo, que se leería como "!") el carácter U+FFFD
+_PYPDF_NBSP = "/nobreakspace"
+_PYMUPDF_NBSP = "\ufffd"
+
+def _pymupdf_layout_text(page: Any) -> str:
+    """
+    Reconstruye el texto de una página de PyMuPDF en columnas fijas, con el mismo criterio que
+    pypdf en modo layout: el guion usa una fuente monoespaciada, así que la columna de cada
+    tramo de texto sale de su coordenada x y del avance entre caracteres de la página.
+    """
+    flags = pymupdf.TEXTFLAGS_DICT & ~pymupdf.TEXT_CID_FOR_UNKNOWN_UNICODE
+    spans = [
+        span
+        for block in page.get_text("dict", flags=flags)["blocks"]
+        for line in block.get("lines", [])
+        for span in line["spans"]
+        if span["text"].strip()
+    ]
+    if not spans: return ""
+    # El PDF aplica espaciado entre caracteres: el avance real es algo menor que el ancho del glifo
+    advances = [
+        (span["bbox"][2] - span["bbox"][0] - span["size"] * _COURIER_PITCH) / (len(span["text"]) - 1)
+        for span in spans if len(span["text"]) > 1
+    ]
+    advance = statistics.median(advances) if advances else spans[0]["size"] * _COURIER_PITCH
+    rows: dict[int, list[tuple[float, str]]] = {}
+    for span in spans:
+        x, y = span["origin"]
+        row = rows.setdefault(round(y), [])
+        # El espacio de no separación se descarta: cada tramo conserva su columna y el hueco
+        # que queda entre ellos se rellena con espacios
+        offset = 0
+        for piece in span["text"].split(_PYMUPDF_NBSP):
+            if piece: row.append((x + offset * advance, piece))
+            offset += len(piece) + 1
+    lines = []
+    for y in sorted(rows):
+        parts: list[str] = []
+        width = 0
+        for x, text in sorted(rows[y]):
+            # Tolerancia frente al redondeo de coordenadas justo en el borde de una columna
+            column = math.floor((x - _PAGE_LEFT_EDGE) / advance + 1e-6)
+            gap = max(column - width, 0)
+            parts += (" " * gap, text)
+            width += gap + len(text)
+        lines.append("".join(parts))
+    return "\n".join(lines)
+
+# Se construye una instancia por línea del guion: sin validación Pydantic en este camino
+@dataclass(slots=True)
+class LineItem:
+    page_number: int
     text_type: Literal["location", "description", "character", "dialog", "raw"]
-    text: StrictStr = Field(min_length=1)
-    margin: PositiveInt
+    text: str
+    margin: int
 
-class Document(BaseModel):
-    text: StrictStr
+# Diccionario plano: el servicio de escenas sólo lee 'text' y 'metadata'
+class Document(TypedDict):
+    text: str
     metadata: dict
 
+# Se recorre la línea una sola vez, sin backtracking (a diferencia del patrón lazy ``.*?``)
+def _match_location(line_text: str) -> tuple[str, int] | None:
+    """
+    Equivalente lineal de ``([AB]?\\d+\\s{2,})(.*?)(\\s{2,}[AB]?\\d+$)``: devuelve el
+    texto central y la longitud de la cabecera (número de escena + espacios).
+    """
+    n = len(line_text)
+    # Cabecera: [AB]?\d+ seguido de al menos dos espacios
+    start = 1 if line_text[:1] in ("A", "B") else 0
+    digits_end = start
+    while digits_end < n and line_text[digits_end].isdecimal():
+        digits_end += 1
+    if digits_end == start:
+        return None
+    head_end = digits_end
+    while head_end < n and line_text[head_end].isspace():
+        head_end += 1
+    if head_end - digits_end < 2:
+        return None
+    # Cola: al menos dos espacios y [AB]?\d+ al final de la línea
+    tail_start = n
+    while tail_start > head_end and line_text[tail_start - 1].isdecimal():
+        tail_start -= 1
+    if tail_start == n:
+        return None
+    if tail_start > head_end and line_text[tail_start - 1] in ("A", "B"):
+        tail_start -= 1
+    text_end = tail_start
+    while text_end > head_end and line_text[text_end - 1].isspace():
+        text_end -= 1
+    if text_end == head_end:
+        # Texto central vacío: cabecera y cola se reparten el mismo bloque de espacios
+        if tail_start - digits_end < 4:
+            return None
+        return "", tail_start - 2
+    if tail_start - text_end < 2:
+        return None
+    return line_text[head_end:text_end], head_end
+
+# Por debajo de este número de páginas el arranque del pool cuesta más de lo que ahorra
+# (el guion completo, 133 páginas, se parsea antes en serie)
+_PARALLEL_MIN_PAGES = 500
+
+# Estado por proceso del pool: cada worker abre el PDF una única vez
+_worker_loader: Optional["MatrixScriptLoader"] = None
+_worker_document: Any = None
+
+def _init_page_worker(loader: "MatrixScriptLoader") -> None:
+    global _worker_loader, _worker_document
+    _worker_loader = loader
+    _worker_document = loader._open_document()
+
+def _parse_page_worker(page_index: int) -> list[LineItem]:
+    return _worker_loader._parse_page_at(_worker_document, page_index)
+
 class MatrixScriptLoader:
     def __init__(
         self,
@@ -23,101 +155,159 @@ class MatrixScriptLoader:
             "FADE IN:", "CONTINUED", "OMITTED", "THE MATRIX - Rev.", "FADE OUT.",
             "THE END", "(MORE)", "FADE TO BLACK.",
         ],
-        location_margins: set[int] = {8, 9},
-        description_margins: set[int] = {8, 9},
-        dialog_margins: set[int] = {21, 30},
-        character_margins: set[int] = {32, 38, 39},
+        location_margins: set[int] | None = None,
+        description_margins: set[int] | None = None,
+        dialog_margins: set[int] | None = None,
+        character_margins: set[int] | None = None,
         start_page: int | None = 1,
         end_page: int | None = None,
+        n_workers: int | None = 1,
+        backend: Literal["pymupdf", "pypdf"] | None = None,
     ):
         self.source_path = source_path
         self.ignoread_tags = ignoread_tags
-        self.location_margins = location_margins
-        self.description_margins = description_margins
-        self.dialog_margins = dialog_margins
-        self.character_margins = character_margins
+        # PyMuPDF extrae el texto bastante más rápido; pypdf queda como respaldo
+        if backend is None:
+            backend = "pymupdf" if pymupdf is not None else "pypdf"
+        if backend == "pymupdf" and pymupdf is None:
+            raise ImportError("El backend 'pymupdf' requiere instalar PyMuPDF (pip install pymupdf)")
+        self.backend = backend
+        # Los márgenes no indicados toman los valores calibrados para el backend
+        default_margins = _DEFAULT_MARGINS[backend]
+        self.location_margins = default_margins["location"] if location_margins is None else location_margins
+        self.description_margins = default_margins["description"] if description_margins is None else description_margins
+        self.dialog_margins = default_margins["dialog"] if dialog_margins is None else dialog_margins
+        self.character_margins = default_margins["character"] if character_margins is None else character_margins
         self.start_page = start_page
         self.end_page = end_page
+        # 1 parsea en el proceso actual; None usa todos los núcleos sólo en documentos largos
+        self.n_workers = n_workers
+        # Una sola alternancia compilada evita recorrer la línea una vez por etiqueta
+        self._ignore_re = regex.compile("|".join(regex.escape(t) for t in ignoread_tags)) if ignoread_tags else None
+        self._dispatch = self._build_dispatch()
+
+    def _build_dispatch(self) -> dict[tuple[bool, int], str]:
+        """
+        Tabla (mayúsculas, indentación) -> tipo de línea. Se rellena de menor a mayor
+        prioridad, de modo que cada entrada respeta el orden original de verificación.
+        """
+        dispatch: dict[tuple[bool, int], str] = {}
+        for text_type, margins, upper_values in (
+            ("description", self.description_margins, (False, True)),
+            ("dialog", self.dialog_margins, (False, True)),
+            ("character", self.character_margins, (True,)),
+        ):
+            for margin in margins:
+                if margin < 2: continue
+                for is_upper in upper_values:
+                    dispatch[(is_upper, margin)] = text_type
+        # Las ubicaciones empiezan por el número de escena: sólo pueden aparecer sin indentación
+        dispatch[(True, 0)] = "location"
+        return dispatch
 
     def _get_location_text(self, line_text: str):
-        if not line_text.isupper(): return None, None
-        match_ = regex.match(r"([AB]?\d+\s{2,})(.*?)(\s{2,}[AB]?\d+$)", line_text)
+        match_ = _match_location(line_text)
         if match_ is None: return None, None
-        groups = match_.groups()
-        margin = len(groups[0])
+        location_text, margin = match_
         if margin not in self.location_margins: return None, None
-        return groups[1].strip(), margin
+        return location_text.strip(), margin
 
-    def _get_character_text(self, line_text: str):
-        if not line_text.isupper(): return None, None
-        match_ = regex.match(r"(\s{2,})(.*)", line_text)
-        if match_ is None: return None, None
-        groups = match_.groups()
-        margin = len(groups[0])
-        if margin not in self.character_margins: return None, None
-        character_text = regex.sub(r"\(.*\)", "", groups[1]).strip()
-        return character_text, margin
-
-    def _get_non_upper_text(self, line_text: str, margins: set[int]):
-        match_ = regex.match(r"(\s{2,})(.*)", line_text)
-        if match_ is None: return None, None
-        groups = match_.groups()
-        margin = len(groups[0])
-        if margin not in margins: return None, None
-        return groups[1].strip(), margin
+    def _parse_page_line(self, line_text: str, page_number: int) -> Optional[LineItem]:
+        if self._ignore_re is not None and self._ignore_re.search(line_text): return None
 
-    def _get_description_text(self, line_text: str):
-        return self._get_non_upper_text(line_text, margins=self.description_margins)
+        # Mayúsculas e indentación determinan el tipo de línea: una única búsqueda en la tabla
+        is_upper = line_text.isupper()
+        body = line_text.lstrip()
+        indent = len(line_text) - len(body)
+        text_type = self._dispatch.get((is_upper, indent))
 
-    def _get_dialog_text(self, line_text: str):
-        return self._get_non_upper_text(line_text, margins=self.dialog_margins)
+        if text_type == "location":
+            # La cola con el número de escena todavía debe verificarse
+            location_text, margin = self._get_location_text(line_text)
+            if location_text: return LineItem(page_number=page_number, text_type="location", text=location_text, margin=margin)
+        elif text_type == "character":
+            character_text = _PAREN_RE.sub("", body).strip()
+            if character_text: return LineItem(page_number=page_number, text_type="character", text=character_text, margin=indent)
+        elif text_type is not None:
+            text = body.rstrip()
+            if text: return LineItem(page_number=page_number, text_type=text_type, text=text, margin=indent)
 
-    def _parse_page_line(self, line_text: str, page_number: int) -> Optional[LineItem]:
-        if any(it in line_text for it in self.ignoread_tags): return None
-        
-        # El orden de verificación es importante para evitar falsos positivos
-        location_text, margin = self._get_location_text(line_text)
-        if location_text: return LineItem(page_number=page_number, text_type="location", text=location_text, margin=margin)
-        
-        character_text, margin = self._get_character_text(line_text)
-        if character_text: return LineItem(page_number=page_number, text_type="character", text=character_text, margin=margin)
-        
-        dialog_text, margin = self._get_dialog_text(line_text)
-        if dialog_text: return LineItem(page_number=page_number, text_type="dialog", text=dialog_text, margin=margin)
-        
-        description_text, margin = self._get_description_text(line_text)
-        if description_text: return LineItem(page_number=page_number, text_type="description", text=description_text, margin=margin)
-        
         no_matched_text = line_text.strip()
         if len(no_matched_text):
             # Asumimos que el texto no clasificado es parte de una descripción
             return LineItem(page_number=page_number, text_type="description", text=no_matched_text, margin=1) 
         return None
 
-    def parse_page(self, page: PageObject) -> list[LineItem]:
-        if self.start_page and page.page_number < self.start_page: return []
-        if self.end_page and page.page_number > self.end_page: return []
-        
-        page_text = page.extract_text(extraction_mode="layout")
-        line_items = (self._parse_page_line(line_text, page.page_number) for line_text in page_text.split("\n"))
+    def _in_page_range(self, page_number: int) -> bool:
+        if self.start_page and page_number < self.start_page: return False
+        if self.end_page and page_number > self.end_page: return False
+        return True
+
+    def _parse_page_text(self, page_text: str, page_number: int) -> list[LineItem]:
+        line_items = (self._parse_page_line(line_text, page_number) for line_text in page_text.splitlines())
         return [li for li in line_items if li is not None]
 
+    def parse_page(self, page: PageObject) -> list[LineItem]:
+        if not self._in_page_range(page.page_number): return []
+        page_text = page.extract_text(extraction_mode="layout").replace(_PYPDF_NBSP, " ")
+        return self._parse_page_text(page_text, page.page_number)
+
+    def _open_document(self) -> Any:
+        if self.backend == "pymupdf":
+            return pymupdf.open(self.source_path)
+        # El PDF se mapea en memoria: el SO carga las páginas bajo demanda, sin copiar el fichero
+        with open(self.source_path, "rb") as f:
+            pdf_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return PdfReader(pdf_map)
+
+    @contextmanager
+    def _opened_document(self) -> Iterator[Any]:
+        """Abre el documento y libera el mmap (pypdf) o el fichero (PyMuPDF) al terminar de parsear."""
+        document = self._open_document()
+        try:
+            yield document
+        finally:
+            if self.backend == "pymupdf":
+                document.close()
+            else:
+                document.stream.close()
+
+    def _parse_page_at(self, document: Any, page_index: int) -> list[LineItem]:
+        # El rango se comprueba antes de extraer el texto, que es el paso costoso
+        if not self._in_page_range(page_index): return []
+        if self.backend == "pymupdf":
+            return self._parse_page_text(_pymupdf_layout_text(document[page_index]), page_index)
+        return self.parse_page(document.pages[page_index])
+
+    def _iter_line_items(self) -> Iterator[LineItem]:
+        """Recorre las líneas parseadas página a página, sin materializar el guion completo."""
+        with self._opened_document() as document:
+            num_pages = len(document) if self.backend == "pymupdf" else len(document.pages)
+            if self.n_workers == 1 or (self.n_workers is None and num_pages < _PARALLEL_MIN_PAGES):
+                parsed_pages = (self._parse_page_at(document, i) for i in tqdm(range(num_pages), desc="Parsing script lines with Regex"))
+                yield from flatten(parsed_pages)
+                return
+        # Cada página es independiente: se extrae y parsea en paralelo, preservando el orden.
+        # Los workers se lanzan con 'spawn': hacer fork desde un proceso con hilos (el servidor) no es seguro
+        with ProcessPoolExecutor(
+            max_workers=self.n_workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_page_worker, initargs=(self,),
+        ) as executor:
+            parsed_pages = executor.map(_parse_page_worker, range(num_pages), chunksize=4)
+            yield from flatten(tqdm(parsed_pages, total=num_pages, desc="Parsing script lines with Regex"))
+
+    def lazy_load(self) -> Iterator[Document]:
+        """Genera un documento por línea parseada, a medida que se recorren las páginas."""
+        for li in self._iter_line_items():
+            text = li.text
+            # Ubicaciones y personajes se repiten a lo largo del guion: se comparte una única copia
+            if li.text_type in ("location", "character"):
+                text = sys.intern(text)
+            yield Document(text=text, metadata={"text_type": li.text_type, "page_number": li.page_number})
+
     def load(self) -> list[Document]:
         """
         Parsea el PDF y devuelve una lista de líneas individuales con metadatos.
         La agrupación se delega a un servicio de nivel superior.
         """
-        reader = PdfReader(self.source_path)
-        parsed_pages = map(self.parse_page, tqdm(reader.pages, total=len(reader.pages), desc="Parsing script lines with Regex"))
-        line_items = list(flatten(parsed_pages))
-        
-        documents = []
-        for li in line_items:
-            # Simplificamos: cada línea es un documento con su propio metadato.
-            metadata = {
-                "text_type": li.text_type,
-                "page_number": li.page_number
-            }
-            documents.append(Document(text=li.text, metadata=metadata))
-            
-        return documents
\ No newline at end of file
+        return list(self.lazy_load())
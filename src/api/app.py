@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
@@ -9,6 +10,20 @@ from src.services.implementations.matrix_document_loader_service import MatrixDo
 
 logger = logging.getLogger("uvicorn")
 
+def _on_index_done(app: FastAPI, task: asyncio.Task) -> None:
+    """Marca la aplicación como lista cuando termina la indexación en segundo plano."""
+    if task.cancelled():
+        app.state.index_error = "La indexación fue cancelada."
+        logger.error("[Startup] La indexación fue cancelada.")
+        return
+    error = task.exception()
+    if error is not None:
+        app.state.index_error = str(error)
+        logger.error(f"[Startup] Error fatal durante la indexación: {error}", exc_info=error)
+        return
+    app.state.ready = True
+    logger.info("[Startup] Indexación completada. La aplicación está lista.")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("[Startup] Inicializando servicios...")
@@ -20,10 +35,14 @@ async def lifespan(app: FastAPI):
         rag_service_instance = RAGService(loader=loader, retriever=retriever, generator=generator)
         
         app.state.rag_service = rag_service_instance
+        app.state.ready = False
+        app.state.index_error = None
         
-        logger.info("[Startup] Iniciando indexación de documentos...")
-        rag_service_instance.index()
-        logger.info("[Startup] Indexación completada. La aplicación está lista.")
+        # La indexación (parseo del PDF + embeddings) corre en un hilo aparte para que la
+        # API arranque de inmediato; /ask responde 503 hasta que termine.
+        logger.info("[Startup] Iniciando indexación de documentos en segundo plano...")
+        app.state.index_task = asyncio.create_task(asyncio.to_thread(rag_service_instance.index))
+        app.state.index_task.add_done_callback(lambda task: _on_index_done(app, task))
         
     except Exception as e:
         logger.error(f"[Startup] Error fatal durante la inicialización: {e}", exc_info=True)
@@ -31,6 +50,14 @@ async def lifespan(app: FastAPI):
 
     yield
     logger.info("[Shutdown] La aplicación se está cerrando.")
+    # Cancelar la tarea no detendría el hilo de indexado: se espera a que termine de escribir
+    # en Qdrant antes de cerrar los clientes (sus errores ya los registra _on_index_done)
+    index_task = app.state.index_task
+    if not index_task.done():
+        logger.info("[Shutdown] Esperando a que termine la indexación en curso...")
+    await asyncio.gather(index_task, return_exceptions=True)
+    await retriever.async_client.close()
+    retriever.client.close()
 
 app = FastAPI(
     title="Matrix Agentic RAG API",
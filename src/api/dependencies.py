@@ -1,9 +1,22 @@
-from fastapi import Request
+from fastapi import HTTPException, Request
 from src.services.rag_service import RAGService
 
+def ensure_ready(request: Request) -> None:
+    """
+    Función de dependencia que rechaza la petición con un 503 mientras la
+    indexación en segundo plano no haya terminado (o si falló).
+    """
+    if getattr(request.app.state, "ready", False):
+        return
+    index_error = getattr(request.app.state, "index_error", None)
+    if index_error:
+        raise HTTPException(status_code=503, detail=f"La indexación falló: {index_error}")
+    raise HTTPException(status_code=503, detail="La indexación de documentos está en curso.")
+
 def get_rag_service(request: Request) -> RAGService:
     """
     Función de dependencia de FastAPI para obtener la instancia de RAGService.
     FastAPI se encargará de inyectar el 'request' de la aplicación.
     """
+    ensure_ready(request)
     return request.app.state.rag_service
@@ -1,10 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
-from src.api.dependencies import get_rag_service
+from src.api.dependencies import ensure_ready, get_rag_service
 from src.api.schemas import AskRequest, AskResponse
 from src.services.rag_service import RAGService
 
 agent_router = APIRouter()
 
+@agent_router.get("/health", dependencies=[Depends(ensure_ready)])
+async def health_endpoint():
+    """
+    Indica si la API está lista para responder consultas (503 mientras se indexa).
+    """
+    return {"status": "ok"}
+
 @agent_router.post("/ask", response_model=AskResponse)
 async def ask_endpoint(
     request: AskRequest,
@@ -1,98 +1,148 @@
+import hashlib
+import json
 import logging
+import os
+import sys
 import uuid
+from pathlib import Path
 from typing import List, Dict, Any, Optional
-from itertools import groupby
 from src.services.document_loader_service import DocumentLoaderService
 from kbac.loaders.matrix_script_loader import MatrixScriptLoader, Document as BaseDocument
 from src.settings.config import settings
 
 
+# Incrementar si cambia el formato de los chunks para invalidar cachés anteriores
+SCENES_CACHE_VERSION = 2
+
+
 class MatrixDocumentLoaderService(DocumentLoaderService):
-    def __init__(self, source_path: Optional[str] = None):
+    def __init__(self, source_path: Optional[str] = None, cache_dir: Optional[str] = None):
         if not source_path:
             source_path = settings.MATRIX_SCRIPT_PATH
         assert source_path is not None, "source_path no puede ser None"
         
         self.source_path = str(source_path)
+        # Un cache_dir vacío desactiva la caché de escenas en disco
+        self.cache_dir = settings.SCENES_CACHE_DIR if cache_dir is None else cache_dir
         self.loader = MatrixScriptLoader(source_path=self.source_path)
         self.logger = logging.getLogger("uvicorn")
 
     def load_documents(self) -> List[dict]:
+        cache_path = self._get_cache_path()
+        if cache_path is not None and cache_path.exists():
+            try:
+                scene_chunks = json.loads(cache_path.read_text(encoding="utf-8"))
+                self.logger.info(f"[Matrix RAG] {len(scene_chunks)} chunks de escenas leídos desde la caché {cache_path}.")
+                return scene_chunks
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"[Matrix RAG] Caché de escenas inválida ({e}); se vuelve a parsear el guion.")
+
+        scene_chunks = self._build_scene_chunks()
+
+        if cache_path is not None:
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = cache_path.with_suffix(".tmp")
+                tmp_path.write_text(json.dumps(scene_chunks, ensure_ascii=False), encoding="utf-8")
+                tmp_path.replace(cache_path)
+            except OSError as e:
+                self.logger.warning(f"[Matrix RAG] No se pudo escribir la caché de escenas: {e}")
+        return scene_chunks
+
+    def _get_cache_path(self) -> Optional[Path]:
+        """
+        Ruta de la caché de escenas, derivada del PDF (mtime + tamaño), el backend de
+        extracción, la colección y la versión del formato. Devuelve None si la caché está desactivada.
+        """
+        if not self.cache_dir:
+            return None
+        try:
+            stat = os.stat(self.source_path)
+        except OSError:
+            return None
+        key = (
+            f"{os.path.abspath(self.source_path)}:{stat.st_mtime_ns}:{stat.st_size}:"
+            f"{self.loader.backend}:{settings.QDRANT_COLLECTION}:{SCENES_CACHE_VERSION}"
+        )
+        key_hash = hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+        return Path(self.cache_dir) / f"matrix_scenes_{key_hash}.json"
+
+    def _build_scene_chunks(self) -> List[dict]:
         self.logger.info("[Matrix RAG] Cargando y agrupando el guion (modo Regex) por escenas...")
-        base_documents: List[BaseDocument] = self.loader.load()
-        
-        dict_documents = [doc.model_dump() for doc in base_documents]
 
         # --- Lógica mejorada para identificar escenas únicas ---
         # Un 'scene_id' único se genera cada vez que encontramos una nueva línea de 'location'.
         # Esto evita que escenas distintas en la misma ubicación se fusionen.
+        # Las líneas se consumen a medida que el loader parsea el PDF: sólo la escena en
+        # curso se mantiene en memoria y se cierra al encontrar la siguiente ubicación.
+        scene_chunks = []
         scene_id = 0
         current_location = None
-        for doc in dict_documents:
+        current_scene_docs: List[BaseDocument] = []
+        for doc in self.loader.lazy_load():
             if doc["metadata"]["text_type"] == "location":
-                current_location = doc["text"]
+                if current_scene_docs:
+                    scene_chunks.append(self._build_scene_chunk(current_scene_docs, current_location, scene_id))
+                    current_scene_docs = []
+                current_location = sys.intern(doc["text"])
                 scene_id += 1  # Nueva escena detectada
-            
-            if current_location:
-                doc["metadata"]["location"] = current_location
-                doc["metadata"]["scene_id"] = scene_id
-
-        # Filtramos las líneas que no pertenecen a ninguna escena y las propias líneas de ubicación
-        docs_with_scene_id = [
-            doc for doc in dict_documents 
-            if "scene_id" in doc["metadata"] and doc["metadata"]["text_type"] != "location"
-        ]
+            elif current_location:
+                # Las líneas previas a la primera ubicación no pertenecen a ninguna escena
+                current_scene_docs.append(doc)
 
-        # Agrupamos por el 'scene_id' único en lugar de por el nombre de la ubicación.
-        # Es crucial ordenar antes de agrupar.
-        grouped_by_scene = groupby(sorted(docs_with_scene_id, key=lambda d: d["metadata"]["scene_id"]), 
-                                   key=lambda doc: doc["metadata"]["scene_id"])
-        
-        scene_chunks = []
-        for scene_id, docs_in_scene_iter in grouped_by_scene:
-            docs_in_scene = list(docs_in_scene_iter)
-            # La ubicación es la misma para todos los documentos de una escena.
-            location = docs_in_scene[0]["metadata"]["location"]
-            
-            scene_content = self._format_scene_content(docs_in_scene, location)
-            # Pasamos el scene_id como scene_number para que sea el número de escena real.
-            scene_metadata = self._aggregate_metadata(docs_in_scene, location, scene_id)
-            
-            scene_chunks.append({
-                "text": scene_content,
-                "page_content": scene_content,
-                "metadata": scene_metadata
-            })
+        if current_scene_docs:
+            scene_chunks.append(self._build_scene_chunk(current_scene_docs, current_location, scene_id))
 
         self.logger.info(f"[Matrix RAG] {len(scene_chunks)} chunks basados en escenas generados.")
         return scene_chunks
 
+    def _build_scene_chunk(self, docs_in_scene: List[BaseDocument], location: str, scene_id: int) -> dict:
+        scene_content = self._format_scene_content(docs_in_scene, location)
+        # Pasamos el scene_id como scene_number para que sea el número de escena real.
+        scene_metadata = self._aggregate_metadata(docs_in_scene, location, scene_id)
+        return {
+            "text": scene_content,
+            "page_content": scene_content,
+            "metadata": scene_metadata
+        }
+
     def _format_scene_content(self, docs: List[dict], location: str) -> str:
-        full_text = f"Location: {location}\n"
+        # Se acumulan las piezas en una lista y se unen al final (evita concatenar en bucle)
+        parts = [f"Location: {location}\n"]
+        append = parts.append
         current_char = None
         for doc in docs:
             text_type = doc["metadata"].get('text_type')
             if text_type == 'character':
                 current_char = doc['text']
             elif text_type == 'dialog':
-                full_text += f"{current_char or 'Unknown'}: {doc['text']}\n"
+                append(f"{current_char or 'Unknown'}: {doc['text']}\n")
             elif text_type == 'description':
-                full_text += f"Scene description: {doc['text']}\n"
-        return full_text.strip()
+                append(f"Scene description: {doc['text']}\n")
+        return "".join(parts).strip()
 
     def _aggregate_metadata(self, docs: List[dict], location: str, scene_number: int) -> Dict[str, Any]:
         # --- Extraer personajes del texto de las líneas de tipo 'character' ---
         # La lógica anterior buscaba un metadato 'character' que no existía.
-        characters = sorted(list(set(
-            doc["text"].upper() for doc in docs if doc["metadata"].get("text_type") == "character"
-        )))
-        page_numbers = sorted(list(set(doc["metadata"].get("page_number") for doc in docs)))
+        # Un único recorrido acumula personajes y el rango de páginas de la escena.
+        characters = set()
+        page_start = page_end = None
+        for doc in docs:
+            metadata = doc["metadata"]
+            if metadata.get("text_type") == "character":
+                characters.add(sys.intern(doc["text"].upper()))
+            page_number = metadata.get("page_number")
+            if page_number is not None:
+                if page_start is None or page_number < page_start:
+                    page_start = page_number
+                if page_end is None or page_number > page_end:
+                    page_end = page_number
         return {
             "scene_number": scene_number,
             "location": location,
-            "characters": characters,
-            "page_start": min(page_numbers) if page_numbers else -1,
-            "page_end": max(page_numbers) if page_numbers else -1,
+            "characters": sorted(characters),
+            "page_start": page_start if page_start is not None else -1,
+            "page_end": page_end if page_end is not None else -1,
             "_id": str(uuid.uuid4()),
             "_collection_name": settings.QDRANT_COLLECTION
         }
\ No newline at end of file
@@ -1,40 +1,128 @@
 import logging
 import asyncio
-from typing import Optional, List, Any
-
-from pydantic import BaseModel, Field
+import functools
+import hashlib
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Optional, List
+
+from more_itertools import chunked
+from pydantic import BaseModel, ConfigDict, Field, field_serializer
 from langchain_core.documents import Document
 from src.services.generator_service import GeneratorService
+from src.services.query_type import get_query_type
+from src.services.semantic_answer_cache import SemanticAnswerCache
+from src.settings.config import settings
 from pydantic_ai import Agent
 
 # --------------------------------------------------------------------------
 # Modelos Pydantic (Con una pequeña mejora)
 # --------------------------------------------------------------------------
 
+# Los modelos son inmutables una vez creados y los campos desconocidos se descartan
+_FROZEN_MODEL_CONFIG = ConfigDict(frozen=True, extra='ignore', validate_assignment=False)
+
 class FilteredContext(BaseModel):
+    model_config = _FROZEN_MODEL_CONFIG
+
     relevant_sentences: List[str] = Field(description="A list of exact sentences from the context that directly answer or are relevant to the user's query.")
 
 class QuantitativeAnalysis(BaseModel):
     """Modelo para la salida del agente de conteo."""
+    model_config = _FROZEN_MODEL_CONFIG
+
     evidence: List[str] = Field(default_factory=list, description="A list of direct quotes from the context that serve as evidence for the user's counting query.")
 
+class BatchedEvidence(BaseModel):
+    """Modelo para la salida del agente de conteo por lotes: una entrada por documento."""
+    model_config = _FROZEN_MODEL_CONFIG
+
+    per_doc: List[QuantitativeAnalysis] = Field(default_factory=list, description="One entry per numbered document, in the same order as the documents appear in the context.")
+
 class QualitativeAnalysis(BaseModel):
     """Modelo para la salida del agente cualitativo. Enfocado solo en el contenido."""
+    model_config = _FROZEN_MODEL_CONFIG
+
     answer: str = Field(description="The synthesized, comprehensive answer to the user's query, based on the context.")
     confidence: float = Field(ge=0.0, le=1.0, description="Confidence score reflecting how well the context supports the answer.")
     reasoning: Optional[str] = Field(None, description="A brief explanation of how the answer was derived from the context.")
 
 class CountingExtraction(BaseModel):
+    model_config = _FROZEN_MODEL_CONFIG
+
     character: Optional[str] = Field(None, description="The character speaking or mentioned, if any.")
     keywords: List[str] = Field(description="The specific keywords, phrases, or objects to count.")
 
+# Las respuestas se crean con model_construct a partir de datos propios o de salidas ya
+# validadas (QualitativeAnalysis, BatchedEvidence); la validación completa ocurre en la API.
 class MatrixResponse(BaseModel):
+    model_config = _FROZEN_MODEL_CONFIG
+
     query: str
     answer: str
     confidence: float = Field(ge=0.0, le=1.0, description="Confidence score from 0.0 to 1.0. This field is ALWAYS required.")
     sources_used: List[str] = Field(default_factory=list)
     reasoning: Optional[str] = None
-    retrieved_documents: Optional[Any] = None
+    retrieved_documents: Optional[List[Document]] = None
+
+    @field_serializer('retrieved_documents')
+    def _serialize_retrieved_documents(self, docs: Optional[List[Document]]) -> Optional[List[dict]]:
+        # Sólo el contenido y los metadatos: el resto de campos de Document no se expone
+        if docs is None:
+            return None
+        return [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs]
+
+# --------------------------------------------------------------------------
+# Prompts de sistema (constantes: se comparten entre todas las instancias)
+# --------------------------------------------------------------------------
+
+# Prompt para el agente que responde preguntas cualitativas.
+_ADVANCED_SYSTEM_PROMPT = """You are a world-class expert on the script of 'The Matrix'. Your task is to answer questions with depth and insight, based ONLY on the provided script context. You must populate the `QualitativeAnalysis` model.
+
+**CRITICAL RULES:**
+1.  **Strictly Contextual:** Your entire response must be derived solely from the provided script excerpts. Do not use any external knowledge.
+2.  **Cite Evidence:** Weave quotes or specific descriptions from the context directly into your answer to support your claims.
+3.  **Synthesize:** If multiple documents are provided, synthesize them into a coherent, well-written answer.
+4.  **Handle Insufficient Context:** If the context is not sufficient, you MUST state that clearly. For example: "Based on the provided context, there is no information about X."
+5.  **Schema Adherence:** You MUST populate all fields of the `QualitativeAnalysis` model. The `confidence` score is ALWAYS REQUIRED. The `reasoning` should explain your conclusion.
+"""
+
+# Prompt para el agente que extrae personaje y keywords de una consulta de conteo.
+_EXTRACTION_SYSTEM_PROMPT = "You are an entity extraction expert. From the user's query, extract the character and the specific keywords/objects to be counted. For 'How many times does Morpheus mention 'the One'?', you must extract character='Morpheus' and keywords=['the One']. For 'How many cars appear?', you must extract character=None and keywords=['car', 'cars']."
+
+# Prompt para el agente que filtra las frases relevantes del contexto.
+_FILTER_SYSTEM_PROMPT = "You are an AI text filter. Your job is to read a large context and extract only the exact sentences that are directly relevant to the user's query. Do not paraphrase, do not answer the query, just extract the verbatim sentences."
+
+# Prompt para el agente que solo cuenta y extrae evidencia.
+_QUANTITATIVE_ANALYSIS_PROMPT = """You are a meticulous and precise evidence-gathering machine. Your ONLY purpose is to analyze the provided script excerpt and extract evidence related to the user's query.
+
+**OPERATIONAL DIRECTIVES:**
+1.  **Identify Target:** Read the user query to understand exactly what to find.
+2.  **Scan Context:** Scrutinize the provided script context to find every single instance of the target.
+3.  **Extract Evidence:** For each instance found, extract the exact sentence as a direct quote.
+4.  **Populate Schema:** You MUST populate the `QuantitativeAnalysis` model.
+    - `evidence`: A list containing all the direct quotes you found.
+5.  **Handle Zero Occurrences:** If no instances are found, return an empty `evidence` list.
+6.  **DO NOT COUNT:** Do not provide a final count or any summary. Just extract the evidence sentences into the list.
+"""
+
+# Prompt para el agente que extrae evidencia de varios documentos numerados a la vez.
+_BATCHED_QUANTITATIVE_ANALYSIS_PROMPT = """You are a meticulous and precise evidence-gathering machine. Your ONLY purpose is to analyze the provided script excerpts and extract evidence related to the user's query.
+
+The context contains several documents, numbered [DOC 0], [DOC 1], ... Analyze each document independently.
+
+**OPERATIONAL DIRECTIVES:**
+1.  **Identify Target:** Read the user query to understand exactly what to find.
+2.  **Scan Each Document:** Scrutinize every numbered document to find every single instance of the target.
+3.  **Extract Evidence:** For each instance found, extract the exact sentence as a direct quote.
+4.  **Populate Schema:** You MUST populate the `BatchedEvidence` model.
+    - `per_doc`: exactly one entry per document, in the same order as the documents. Each entry's `evidence` is the list of direct quotes found in that document.
+5.  **Handle Zero Occurrences:** If a document has no instances, its entry must have an empty `evidence` list.
+6.  **DO NOT COUNT:** Do not provide a final count or any summary. Just extract the evidence sentences into the lists.
+"""
+
+# Cabecera + texto de cada documento del contexto (el método .format se resuelve una sola vez)
+_DOCUMENT_TEMPLATE = "--- Document (Scene: {}, Location: {}) ---\n{}".format
 
 # --------------------------------------------------------------------------
 # Servicio Generador Principal
@@ -45,95 +133,158 @@ class MatrixGeneratorService(GeneratorService):
         self.model_name = model_name
         self.logger = logging.getLogger("uvicorn")
 
-        # --- Agentes Especializados ---
+        # Límite de llamadas concurrentes al LLM, compartido por todas las peticiones
+        self._llm_semaphore = asyncio.Semaphore(settings.MATRIX_MAX_CONCURRENCY)
 
-        self.advanced_agent = Agent(
-            model_name,
-            output_type=QualitativeAnalysis,
-            system_prompt=self._get_advanced_system_prompt()
-        )
-        
-        self.extraction_agent = Agent(
-            model_name,
-            output_type=CountingExtraction,
-            system_prompt="You are an entity extraction expert. From the user's query, extract the character and the specific keywords/objects to be counted. For 'How many times does Morpheus mention 'the One'?', you must extract character='Morpheus' and keywords=['the One']. For 'How many cars appear?', you must extract character=None and keywords=['car', 'cars']."
+        # Caché semántica de respuestas cualitativas: se consulta con el embedding que el llamador
+        # ya calculó para la recuperación (mismo encoder), sin volver a llamar a OpenAI
+        self.answer_cache = SemanticAnswerCache(
+            threshold=settings.ANSWER_CACHE_THRESHOLD,
+            max_contexts=settings.ANSWER_CACHE_MAX_CONTEXTS,
         )
 
-        self.filter_agent = Agent(
-            model_name,
-            output_type=FilteredContext,
-            system_prompt="You are an AI text filter. Your job is to read a large context and extract only the exact sentences that are directly relevant to the user's query. Do not paraphrase, do not answer the query, just extract the verbatim sentences."
-        )
+        # Caché de planes cuantitativos (personaje, keywords, hash del contexto) -> evidencia
+        self._plan_cache: "OrderedDict[tuple, List[str]]" = OrderedDict()
 
-        self.counting_agent = Agent(
-            model_name,
-            output_type=QuantitativeAnalysis,
-            system_prompt=self._get_quantitative_analysis_prompt()
+        # --- Agentes Especializados ---
+        # Se comparten entre peticiones e instancias con el mismo modelo: sólo se invoca .run(),
+        # que no guarda estado en el agente, así que es seguro usarlos de forma concurrente.
+        agents = self._agents_for(model_name)
+        self.advanced_agent = agents.advanced
+        self.extraction_agent = agents.extraction
+        self.filter_agent = agents.filter
+        self.counting_agent = agents.counting
+        self.batched_counting_agent = agents.batched_counting
+
+    @classmethod
+    @functools.cache
+    def _agents_for(cls, model_name: str) -> SimpleNamespace:
+        """Construye (una vez por modelo) los agentes especializados con sus esquemas de salida."""
+        return SimpleNamespace(
+            advanced=Agent(
+                model_name,
+                output_type=QualitativeAnalysis,
+                system_prompt=_ADVANCED_SYSTEM_PROMPT
+            ),
+            extraction=Agent(
+                model_name,
+                output_type=CountingExtraction,
+                system_prompt=_EXTRACTION_SYSTEM_PROMPT
+            ),
+            filter=Agent(
+                model_name,
+                output_type=FilteredContext,
+                system_prompt=_FILTER_SYSTEM_PROMPT
+            ),
+            counting=Agent(
+                model_name,
+                output_type=QuantitativeAnalysis,
+                system_prompt=_QUANTITATIVE_ANALYSIS_PROMPT
+            ),
+            batched_counting=Agent(
+                model_name,
+                output_type=BatchedEvidence,
+                system_prompt=_BATCHED_QUANTITATIVE_ANALYSIS_PROMPT
+            ),
         )
 
-    async def generate_response(self, query: str, context: list) -> MatrixResponse:
+    async def generate_response(
+        self, query: str, context: list, keywords: Optional[List[str]] = None, character: Optional[str] = None,
+        query_embedding: Optional[List[float]] = None,
+    ) -> MatrixResponse:
         normalized_context = self._normalize_context(context)
         query_type = self._get_query_type(query)
 
         if query_type == 'QUANTITATIVE':
-            return await self._handle_quantitative_query(query, normalized_context)
+            return await self._handle_quantitative_query(query, normalized_context, keywords, character)
         else:
-            return await self._handle_qualitative_query(query, normalized_context)
+            return await self._handle_qualitative_query(query, normalized_context, query_embedding)
 
-    async def _handle_qualitative_query(self, query: str, context: List[Document]) -> MatrixResponse:
+    async def _handle_qualitative_query(
+        self, query: str, context: List[Document], query_embedding: Optional[List[float]] = None
+    ) -> MatrixResponse:
         if not context:
-            return MatrixResponse(query=query, answer="I could not find any relevant context to answer this question.", confidence=0.0)
+            return MatrixResponse.model_construct(query=query, answer="I could not find any relevant context to answer this question.", confidence=0.0)
+
+        # 0. Consultar la caché: el hash del contexto forma parte obligatoria de la clave
+        ctx_hash = None
+        if query_embedding is not None:
+            ctx_hash = SemanticAnswerCache.context_hash(doc.metadata.get("scene_number") for doc in context)
+            cached = self.answer_cache.get(query_embedding, ctx_hash)
+            if cached is not None:
+                self.logger.info("[Semantic Cache] Respuesta reutilizada para una consulta equivalente.")
+                # Datos ya validados al guardarlos: se reconstruye sin volver a validar
+                return MatrixResponse.model_construct(**{**cached, "query": query})
 
         # 1. Usar el agente cualitativo para obtener el análisis de contenido
-        prompt = f"User Query: {query}\n\nScript Context:\n{self._format_context(context)}"
-        result = await self.advanced_agent.run(prompt)
+        result = await self.advanced_agent.run(self._build_prompt(query, self._format_context(context)))
         analysis_output = result.output
 
         # 2. Construir el objeto MatrixResponse final en Python (más robusto)
-        return MatrixResponse(
+        response = MatrixResponse.model_construct(
             query=query,
             answer=analysis_output.answer,
             confidence=analysis_output.confidence,
             reasoning=analysis_output.reasoning
         )
+        if query_embedding is not None:
+            self.answer_cache.put(query_embedding, ctx_hash, response.model_dump())
+        return response
 
-    async def _handle_quantitative_query(self, query: str, context: List[Document]) -> MatrixResponse:
+    async def _handle_quantitative_query(
+        self, query: str, context: List[Document], keywords: Optional[List[str]] = None, character: Optional[str] = None
+    ) -> MatrixResponse:
         if not context:
-            return MatrixResponse(
+            return MatrixResponse.model_construct(
                 query=query,
                 answer="No relevant context was found to perform the count.",
                 confidence=0.0,
                 reasoning="The retrieval step did not return any documents matching the extracted entities."
             )
 
-        # --- ESTRATEGIA DE CONTEO MEJORADA: MAP-REDUCE ---
-        # En lugar de enviar todo el contexto de una vez (lo que puede abrumar al LLM),
-        # creamos una tarea de conteo para cada documento recuperado y luego agregamos los resultados.
-        # Esto es mucho más preciso para tareas de alta recordación como el conteo.
-
-        # 1. Crear una tarea de análisis para cada documento (Map)
-        tasks = []
-        for doc in context:
-            # El prompt ahora es específico para un solo documento, más fácil de procesar para el LLM
-            single_doc_prompt = f"User Query: '{query}'\n\nScript Context:\n{self._format_context([doc])}"
-            tasks.append(self.counting_agent.run(single_doc_prompt))
-
-        # 2. Ejecutar todas las tareas en paralelo y recopilar resultados
-        analysis_results = await asyncio.gather(*tasks)
-
-        # 3. Agregar los resultados (Reduce)
-        all_evidence = []
-        for result in analysis_results:
-            # La salida del agente ahora es solo una lista de evidencias
-            if result and result.output and hasattr(result.output, 'evidence'):
-                all_evidence.extend(result.output.evidence)
-
-        # 4. Contar y deduplicar la evidencia en Python (mucho más robusto)
+        # Documentos repetidos no aportan evidencia nueva y cuestan una llamada al LLM
+        seen_contents = set()
+        context = [doc for doc in context if not (doc.page_content in seen_contents or seen_contents.add(doc.page_content))]
+
+        # Si ninguna keyword extraída aparece (sin distinguir mayúsculas) en el contexto, el conteo es 0
+        # sin necesidad de llamar al LLM. Ante cualquier coincidencia se sigue el camino normal.
+        keywords_lc = [kw.lower() for kw in keywords or [] if kw]
+        if keywords_lc:
+            joined_context = "\n".join(doc.page_content for doc in context).lower()
+            if not any(kw in joined_context for kw in keywords_lc):
+                return MatrixResponse.model_construct(
+                    query=query,
+                    answer="Based on the provided context, there are 0 occurrences.",
+                    confidence=1.0,
+                    reasoning=f"None of the extracted keywords {keywords} appear in the {len(context)} retrieved script scenes."
+                )
+
+        # 1. Obtener la evidencia. Con un contexto pequeño basta una sola llamada con todo
+        #    el contexto; si no, map-reduce por lotes de documentos.
+        #    El mismo plan (personaje + keywords) sobre el mismo contexto reutiliza la evidencia.
+        plan_key = self._get_plan_key(context, keywords, character) if keywords_lc else None
+        all_evidence = self._plan_cache.get(plan_key) if plan_key is not None else None
+        if all_evidence is not None:
+            self._plan_cache.move_to_end(plan_key)
+            self.logger.info("[Plan Cache] Evidencia reutilizada para las mismas entidades y contexto.")
+        else:
+            if sum(len(doc.page_content) for doc in context) < settings.SMALL_CONTEXT_CHARS:
+                all_evidence = await self._collect_small_context_evidence(query, context)
+            else:
+                all_evidence = await self._collect_batched_evidence(query, context)
+            if plan_key is not None:
+                self._plan_cache[plan_key] = all_evidence
+                while len(self._plan_cache) > settings.PLAN_CACHE_SIZE:
+                    self._plan_cache.popitem(last=False)
+
+        # 2. Contar y deduplicar la evidencia en Python (mucho más robusto)
         # Se eliminan duplicados por si el LLM extrae la misma frase de contextos ligeramente diferentes
-        unique_evidence = sorted(list(set(all_evidence)), key=all_evidence.index)
+        # (una sola pasada, conservando el orden de la primera aparición)
+        seen = set()
+        unique_evidence = [e for e in all_evidence if not (e in seen or seen.add(e))]
         total_count = len(unique_evidence)
 
-        # 5. Construir la respuesta final a partir de los datos agregados
+        # 3. Construir la respuesta final a partir de los datos agregados
         if total_count > 0:
             evidence_list = "\n".join(f"- \"{e}\"" for e in unique_evidence)
             answer = (
@@ -145,62 +296,97 @@ class MatrixGeneratorService(GeneratorService):
 
         reasoning = f"A specialized counting agent analyzed {len(context)} pre-filtered script scenes to find the occurrences."
 
-        # 6. Construir y devolver el objeto MatrixResponse final
-        return MatrixResponse(
+        # 4. Construir y devolver el objeto MatrixResponse final
+        return MatrixResponse.model_construct(
             query=query,
             answer=answer,
             confidence=1.0, # La confianza es alta porque el proceso es determinístico post-análisis
             reasoning=reasoning
         )
 
+    async def _collect_small_context_evidence(self, query: str, context: List[Document]) -> List[str]:
+        """Extrae la evidencia de un contexto pequeño en una única llamada al agente de conteo."""
+        async with self._llm_semaphore:
+            result = await self.counting_agent.run(self._build_prompt(f"'{query}'", self._format_context(context)))
+        # Sin resultado o sin evidencia: un único AttributeError cubre todos los casos defensivos
+        try:
+            return list(result.output.evidence)
+        except AttributeError:
+            return []
+
+    async def _collect_batched_evidence(self, query: str, context: List[Document]) -> List[str]:
+        # --- ESTRATEGIA DE CONTEO MEJORADA: MAP-REDUCE POR LOTES ---
+        # En lugar de enviar todo el contexto de una vez (lo que puede abrumar al LLM),
+        # los documentos se agrupan en lotes pequeños y numerados: cada llamada devuelve la
+        # evidencia de cada documento por separado y luego se agregan los resultados.
+        # Se mantiene la precisión del conteo documento a documento con muchas menos llamadas.
+        batches = list(chunked(context, settings.COUNTING_BATCH_SIZE))
+
+        # 1. Crear una tarea de análisis para cada lote de documentos (Map)
+        async def count_batch(index: int, batch: List[Document]):
+            # El semáforo limita las llamadas simultáneas al LLM para no superar los límites del proveedor
+            async with self._llm_semaphore:
+                prompt = self._build_prompt(f"'{query}'", self._format_numbered_context(batch))
+                return index, await self.batched_counting_agent.run(prompt)
+
+        # 2. Ejecutar las tareas en paralelo y agregar cada resultado en cuanto termina (Reduce)
+        #    El TaskGroup cancela los lotes pendientes si uno falla, en lugar de dejarlos huérfanos
+        evidence_by_batch: List[List[str]] = [[] for _ in batches]
+        try:
+            async with asyncio.TaskGroup() as task_group:
+                tasks = [task_group.create_task(count_batch(index, batch)) for index, batch in enumerate(batches)]
+                for next_result in asyncio.as_completed(tasks):
+                    index, result = await next_result
+                    # La salida del agente es una lista de evidencias por documento del lote
+                    try:
+                        evidence_by_batch[index] = [e for analysis in result.output.per_doc for e in analysis.evidence]
+                    except AttributeError:
+                        pass
+        except ExceptionGroup as group:
+            # Se propaga el error original para conservar el mensaje que llega a la API
+            raise group.exceptions[0]
+
+        # 3. La evidencia se recorre en el orden de los documentos: la respuesta no depende
+        #    del orden en que terminan las llamadas
+        return [e for evidence in evidence_by_batch for e in evidence]
+
+    def _get_plan_key(self, context: List[Document], keywords: List[str], character: Optional[str]) -> tuple:
+        """Clave del plan de conteo: entidades extraídas + hash del contenido del contexto."""
+        ctx_hash = hashlib.blake2b(b"\x00".join(doc.page_content.encode("utf-8") for doc in context), digest_size=16).hexdigest()
+        return (character.upper() if character else None, tuple(sorted(keywords)), ctx_hash)
+
     def _get_query_type(self, query: str) -> str:
-        query_lower = query.lower()
-        quantitative_indicators = ["how many times", "how many", "count", "list all", "find every"]
-        if any(indicator in query_lower for indicator in quantitative_indicators):
-            return 'QUANTITATIVE'
-        return 'QUALITATIVE'
+        return get_query_type(query)
 
     def _normalize_context(self, context: list) -> List[Document]:
-        normalized = []
-        for doc in context:
-            if isinstance(doc, Document):
-                normalized.append(doc)
-            elif isinstance(doc, dict):
-                page_content = doc.get('page_content') or doc.get('text') or ''
-                metadata = doc.get('metadata', {})
-                normalized.append(Document(page_content=page_content, metadata=metadata))
-        return normalized
+        # Caso habitual (Document exacto) resuelto con una comparación de tipo; el resto se descarta
+        return [
+            doc if type(doc) is Document or isinstance(doc, Document)
+            else Document(page_content=doc.get('page_content') or doc.get('text') or '', metadata=doc.get('metadata') or {})
+            for doc in context if isinstance(doc, (Document, dict))
+        ]
+
+    def _build_prompt(self, query: str, context_text: str) -> List[str]:
+        """
+        Contexto primero y consulta al final, como partes separadas del mensaje: el system prompt
+        y el contexto forman un prefijo estable que el proveedor puede cachear entre consultas.
+        """
+        return [f"Script Context:\n{context_text}", f"User Query: {query}"]
+
+    def _context_rows(self, docs: List[Document]) -> List[tuple]:
+        """Tuplas (escena, ubicación, texto) con una sola lectura de los metadatos por documento."""
+        rows = []
+        append = rows.append
+        for doc in docs:
+            metadata = doc.metadata
+            append((metadata.get('scene_number', 'N/A'), metadata.get('location', 'Unknown'), doc.page_content))
+        return rows
 
     def _format_context(self, docs: List[Document]) -> str:
         if not docs:
             return "No context provided."
-        return "\n\n".join(
-            f"--- Document (Scene: {doc.metadata.get('scene_number', 'N/A')}, Location: {doc.metadata.get('location', 'Unknown')}) ---\n{doc.page_content}"
-            for doc in docs
-        )
-
-    def _get_advanced_system_prompt(self) -> str:
-        """Prompt para el agente que responde preguntas cualitativas."""
-        return """You are a world-class expert on the script of 'The Matrix'. Your task is to answer questions with depth and insight, based ONLY on the provided script context. You must populate the `QualitativeAnalysis` model.
+        return "\n\n".join([_DOCUMENT_TEMPLATE(*row) for row in self._context_rows(docs)])
 
-**CRITICAL RULES:**
-1.  **Strictly Contextual:** Your entire response must be derived solely from the provided script excerpts. Do not use any external knowledge.
-2.  **Cite Evidence:** Weave quotes or specific descriptions from the context directly into your answer to support your claims.
-3.  **Synthesize:** If multiple documents are provided, synthesize them into a coherent, well-written answer.
-4.  **Handle Insufficient Context:** If the context is not sufficient, you MUST state that clearly. For example: "Based on the provided context, there is no information about X."
-5.  **Schema Adherence:** You MUST populate all fields of the `QualitativeAnalysis` model. The `confidence` score is ALWAYS REQUIRED. The `reasoning` should explain your conclusion.
-"""
-
-    def _get_quantitative_analysis_prompt(self) -> str:
-        """Prompt para el agente que solo cuenta y extrae evidencia."""
-        return """You are a meticulous and precise evidence-gathering machine. Your ONLY purpose is to analyze the provided script excerpt and extract evidence related to the user's query.
-
-**OPERATIONAL DIRECTIVES:**
-1.  **Identify Target:** Read the user query to understand exactly what to find.
-2.  **Scan Context:** Scrutinize the provided script context to find every single instance of the target.
-3.  **Extract Evidence:** For each instance found, extract the exact sentence as a direct quote.
-4.  **Populate Schema:** You MUST populate the `QuantitativeAnalysis` model.
-    - `evidence`: A list containing all the direct quotes you found.
-5.  **Handle Zero Occurrences:** If no instances are found, return an empty `evidence` list.
-6.  **DO NOT COUNT:** Do not provide a final count or any summary. Just extract the evidence sentences into the list.
-"""
\ No newline at end of file
+    def _format_numbered_context(self, docs: List[Document]) -> str:
+        """Contexto con los documentos numerados [DOC 0]..[DOC N-1] para el conteo por lotes."""
+        return "\n\n".join([f"[DOC {i}] {_DOCUMENT_TEMPLATE(*row)}" for i, row in enumerate(self._context_rows(docs))])
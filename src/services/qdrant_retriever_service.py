@@ -1,14 +1,29 @@
 import uuid
+import asyncio
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Union
+from more_itertools import chunked
 from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
 from langchain_core.documents import Document
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams, Filter, FieldCondition, MatchValue
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http.models import (
+    Distance, VectorParams, Filter, FieldCondition, MatchValue, MatchText, MatchPhrase,
+    PayloadSchemaType, PointStruct, QueryRequest, TextIndexParams, TextIndexType, TokenizerType,
+    QuantizationSearchParams, ScalarQuantization, ScalarQuantizationConfig, ScalarType, SearchParams,
+)
 from pydantic import SecretStr
 from src.settings.config import settings
 from src.services.retriever_service import RetrieverService
+from src.services.semantic_result_cache import SemanticResultCache
+
+# Los candidatos obtenidos con los vectores cuantizados se reordenan con los originales
+_SEARCH_PARAMS = SearchParams(
+    hnsw_ef=settings.QDRANT_HNSW_EF,
+    quantization=QuantizationSearchParams(rescore=True, oversampling=2.0),
+)
 
 class QdrantRetrieverService(RetrieverService):
     def __init__(self):
@@ -17,6 +32,12 @@ class QdrantRetrieverService(RetrieverService):
             self.embedding_dims = settings.QDRANT_EMBEDDING_DIMS
             self.collection_name = settings.QDRANT_COLLECTION
             self.client = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+            # Las consultas se sirven con el cliente asíncrono sobre gRPC: no bloquean el event loop
+            # y evitan el coste por petición de HTTP. El cliente síncrono queda para el indexado.
+            self.async_client = AsyncQdrantClient(
+                host=settings.QDRANT_HOST, port=settings.QDRANT_PORT,
+                grpc_port=settings.QDRANT_GRPC_PORT, prefer_grpc=True,
+            )
             
             api_key = settings.OPENAI_API_KEY
             if not isinstance(api_key, SecretStr):
@@ -27,7 +48,18 @@ class QdrantRetrieverService(RetrieverService):
                 dimensions=self.embedding_dims,
                 api_key=api_key
             )
-            self.vector_store = None
+            # Una vez observada con vectores, la colección no vuelve a quedar vacía en este proceso
+            self._initialized = False
+            # LRU de embeddings por instancia: las consultas repetidas no vuelven a llamar a OpenAI
+            self._embedding_cache: "OrderedDict[str, tuple]" = OrderedDict()
+            # Protege las cachés frente al hilo de indexado
+            self._cache_lock = threading.Lock()
+            # Las peticiones concurrentes no superan el límite de embeddings del tier de OpenAI
+            self._embed_semaphore = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+            # Resultados de búsquedas recientes: una consulta casi idéntica no repite la búsqueda ANN
+            self.result_cache = SemanticResultCache(
+                threshold=settings.RETRIEVAL_CACHE_THRESHOLD, capacity=settings.RETRIEVAL_CACHE_SIZE
+            )
             self._ensure_collection()
             self.logger.info("[Init] QdrantRetrieverService inicializado correctamente.")
         except Exception as e:
@@ -41,100 +73,214 @@ class QdrantRetrieverService(RetrieverService):
             self.client.create_collection(
                 collection_name=self.collection_name,
                 vectors_config=VectorParams(size=self.embedding_dims, distance=Distance.COSINE),
+                # Copia int8 de los vectores en RAM para recorrer el HNSW (4x menos memoria/ancho de banda);
+                # con 256 dimensiones la cuantización binaria pierde demasiado recall
+                quantization_config=ScalarQuantization(
+                    scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+                ),
             )
-        self.vector_store = QdrantVectorStore(
-            client=self.client,
-            collection_name=self.collection_name,
-            embedding=self.embeddings,
-        )
+        self._ensure_payload_indexes()
+
+    def _ensure_payload_indexes(self):
+        """
+        Índices de payload sobre los metadatos usados en filtros: Qdrant resuelve los filtros
+        con un índice invertido en lugar de recorrer todos los puntos.
+        """
+        for field_name, field_schema in (
+            ("metadata.characters", PayloadSchemaType.KEYWORD),
+            ("metadata.location", PayloadSchemaType.KEYWORD),
+            ("metadata.scene_number", PayloadSchemaType.INTEGER),
+            # Índice de texto para filtrar keywords en el servidor (prefijos de palabra, sin mayúsculas);
+            # las posiciones de los tokens permiten exigir frases completas y en orden
+            ("page_content", TextIndexParams(
+                type=TextIndexType.TEXT, tokenizer=TokenizerType.PREFIX, lowercase=True, phrase_matching=True,
+            )),
+        ):
+            try:
+                # Crear un índice que ya existe no tiene efecto: es seguro en cada arranque
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema,
+                )
+            except Exception as e:
+                self.logger.warning(f"[Init] No se pudo crear el índice de payload '{field_name}': {e}")
 
     def index_documents(self, documents: List[dict]):
         self.logger.info(f"[Matrix RAG] Indexando {len(documents)} documentos en Qdrant...")
         docs = [Document(page_content=doc.get("page_content", ""), metadata=doc.get("metadata", {})) for doc in documents]
         uuids = [doc.get("metadata", {}).get("_id", str(uuid.uuid4())) for doc in documents]
-        if self.vector_store:
-            self.vector_store.add_documents(documents=docs, ids=uuids)
-            self.logger.info(f"[Matrix RAG] Indexado completo.")
-        else:
-            self.logger.error("[Matrix RAG] vector_store no inicializado.")
-
-    def retrieve(self, query: str, top_k: int = 10) -> List[Document]:
-        if not self.vector_store:
+        batches = list(zip(chunked(docs, settings.INDEX_BATCH_SIZE), chunked(uuids, settings.INDEX_BATCH_SIZE)))
+        if not batches:
+            return
+
+        # Una llamada de embeddings por lote; los lotes se embeben en paralelo con un límite
+        # de concurrencia para no superar el rate limit de OpenAI
+        def embed_batch(batch: List[Document]) -> List[List[float]]:
+            return self.embeddings.embed_documents([doc.page_content for doc in batch])
+
+        with ThreadPoolExecutor(max_workers=min(settings.EMBEDDING_MAX_CONCURRENCY, len(batches))) as executor:
+            batch_vectors = executor.map(embed_batch, (batch for batch, _ in batches))
+            for i, ((batch, batch_ids), vectors) in enumerate(zip(batches, batch_vectors), start=1):
+                # Mismo formato de payload que langchain-qdrant (page_content + metadata)
+                points = [
+                    PointStruct(id=point_id, vector=vector, payload={"page_content": doc.page_content, "metadata": doc.metadata})
+                    for point_id, vector, doc in zip(batch_ids, vectors, batch)
+                ]
+                # Sólo se espera al último upsert: Qdrant aplica las actualizaciones en orden, así
+                # que al terminar la indexación todos los puntos ya son consultables
+                self.client.upsert(collection_name=self.collection_name, points=points, wait=i == len(batches))
+
+        # Los resultados cacheados ya no reflejan la colección
+        with self._cache_lock:
+            self.result_cache.clear()
+        self.logger.info(f"[Matrix RAG] Indexado completo.")
+
+    async def retrieve(self, query: str, top_k: int = 10) -> List[Document]:
+        return (await self.batch_retrieve([query], top_k=top_k))[0]
+
+    async def batch_retrieve(self, queries: List[str], top_k: int = 10) -> List[List[Document]]:
+        """
+        Búsqueda semántica de varias consultas: los embeddings que faltan se piden en una sola
+        llamada y las búsquedas no cacheadas viajan juntas en una única petición a Qdrant.
+        """
+        if not queries:
             return []
-        
+
         # --- Usar el cliente directamente para obtener IDs ---
         # Esto nos da control para añadir el ID de Qdrant a los metadatos para trazabilidad.
-        query_embedding = self.embeddings.embed_query(query)
-        hits = self.client.search(
+        query_embeddings = await self.embed_queries(queries)
+        results: List[List[Document]] = [[] for _ in queries]
+        pending = []
+        with self._cache_lock:
+            for i, query_embedding in enumerate(query_embeddings):
+                cached_docs = self.result_cache.get(query_embedding, top_k)
+                if cached_docs is not None:
+                    results[i] = list(cached_docs)
+                else:
+                    pending.append(i)
+        if not pending:
+            return results
+
+        responses = await self.async_client.query_batch_points(
             collection_name=self.collection_name,
-            query_vector=query_embedding,
-            limit=top_k,
-            with_payload=True
+            requests=[
+                QueryRequest(query=query_embeddings[i], limit=top_k, with_payload=True, params=_SEARCH_PARAMS)
+                for i in pending
+            ],
         )
-        
-        docs = []
-        for hit in hits:
-            docs.append(self._create_document_from_point(hit))
-        return docs
+        for i, response in zip(pending, responses):
+            docs = [self._create_document_from_point(point) for point in response.points]
+            with self._cache_lock:
+                self.result_cache.put(query_embeddings[i], top_k, docs)
+            results[i] = list(docs)
+        return results
+
+    async def embed_query(self, query: str) -> List[float]:
+        """Embedding de la consulta, cacheado por texto (sin espacios sobrantes en los extremos)."""
+        return (await self.embed_queries([query]))[0]
+
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embeddings de varias consultas: las que no están en la caché se piden en una sola llamada."""
+        keys = [query.strip() for query in queries]
+        with self._cache_lock:
+            cached = {key: self._embedding_cache[key] for key in keys if key in self._embedding_cache}
+            for key in cached:
+                self._embedding_cache.move_to_end(key)
+        missing = list(dict.fromkeys(key for key in keys if key not in cached))
+        if missing:
+            # Tuplas inmutables: el valor cacheado no puede modificarse desde fuera
+            async with self._embed_semaphore:
+                embedded = await self.embeddings.aembed_documents(missing)
+            vectors = [tuple(vector) for vector in embedded]
+            with self._cache_lock:
+                for key, vector in zip(missing, vectors):
+                    cached[key] = self._embedding_cache[key] = vector
+                while len(self._embedding_cache) > settings.EMBEDDING_CACHE_SIZE:
+                    self._embedding_cache.popitem(last=False)
+        return [list(cached[key]) for key in keys]
 
     def is_initialized(self) -> bool:
+        if self._initialized:
+            return True
         try:
             info = self.client.get_collection(self.collection_name)
-            return info.vectors_count > 0 if hasattr(info, "vectors_count") and info.vectors_count is not None else False
+            return self._has_vectors(info)
         except Exception:
             return False
 
-    def filter_retrieve(self, must_conditions: list[dict], query_text: Union[str, list[str]] = "") -> List[Document]:
+    async def ais_initialized(self) -> bool:
+        """Versión asíncrona de ``is_initialized`` para el camino de consulta."""
+        if self._initialized:
+            return True
+        try:
+            info = await self.async_client.get_collection(self.collection_name)
+            return self._has_vectors(info)
+        except Exception:
+            return False
+
+    def _has_vectors(self, info) -> bool:
+        # CollectionInfo ya no expone vectors_count: cada punto lleva su vector, basta con points_count
+        has_vectors = (info.points_count or 0) > 0
+        # Sólo se cachea el resultado positivo: una colección vacía se vuelve a consultar
+        if has_vectors:
+            self._initialized = True
+        return has_vectors
+
+    async def filter_retrieve(self, must_conditions: list[dict], query_text: Union[str, list[str]] = "") -> List[Document]:
         """
         Recupera TODOS los documentos que cumplen con filtros de metadatos y contienen TODAS las frases/keywords.
         """
-        if not self.is_initialized():
+        if not await self.ais_initialized():
             self.logger.warning("filter_retrieve llamado pero la colección parece vacía.")
             return []
     
-        qdrant_filter = None
-        if must_conditions:
-            qdrant_filter = Filter(
-                must=[
-                    FieldCondition(key=f"metadata.{cond['key']}", match=MatchValue(value=cond['value']))
-                    for cond in must_conditions
-                ]
-            )
-    
-        found_points, _ = self.client.scroll(
-            collection_name=self.collection_name,
-            scroll_filter=qdrant_filter,
-            limit=1000,
-            with_payload=True,
-            with_vectors=False,
-        )
-        
         # --- LÓGICA DE KEYWORDS ---
+        # Sin .lower(): el índice de texto pasa a minúsculas tanto el contenido como la consulta
         keywords_to_check = []
         if isinstance(query_text, str) and query_text.strip():
-            keywords_to_check.append(query_text.lower())
+            keywords_to_check.append(query_text)
         elif isinstance(query_text, list):
-            keywords_to_check = [kw.lower() for kw in query_text if kw and isinstance(kw, str)]
-
-        # Si no hay keywords, devolvemos todos los documentos que coinciden con el filtro.
-        if not keywords_to_check:
-            return [self._create_document_from_point(p) for p in found_points]
+            keywords_to_check = [kw for kw in query_text if kw and isinstance(kw, str)]
 
+        # Metadatos y keywords se filtran en Qdrant: el documento debe contener TODAS las
+        # frases/keywords (índice de texto) y sólo viajan por la red los puntos que coinciden.
+        must = [
+            FieldCondition(key=f"metadata.{cond['key']}", match=MatchValue(value=cond['value']))
+            for cond in must_conditions
+        ]
+        must.extend(FieldCondition(key="page_content", match=self._keyword_match(kw)) for kw in keywords_to_check)
+        qdrant_filter = Filter(must=must) if must else None
+    
+        # Paginación por offset: páginas acotadas hasta agotar los resultados o alcanzar el máximo
         results = []
-        for point in found_points:
-            if not point.payload:
-                continue
-            
-            page_content = point.payload.get("page_content", "")
-            page_content_lower = page_content.lower()
-            
-            # El documento debe contener TODAS las frases/keywords como subcadenas
-            if all(kw in page_content_lower for kw in keywords_to_check):
-                results.append(self._create_document_from_point(point))
-                
+        offset = None
+        while len(results) < settings.FILTER_MAX_RESULTS:
+            found_points, offset = await self.async_client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=qdrant_filter,
+                limit=min(settings.FILTER_SCROLL_PAGE_SIZE, settings.FILTER_MAX_RESULTS - len(results)),
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            results.extend(self._create_document_from_point(p) for p in found_points)
+            if offset is None:
+                break
+
         self.logger.info(f"filter_retrieve encontró {len(results)} documentos para condiciones={must_conditions} y keywords={keywords_to_check}")
         return results
 
+    @staticmethod
+    def _keyword_match(keyword: str) -> Union[MatchText, MatchPhrase]:
+        """
+        MatchText trata cada palabra por separado ("the one" aceptaría cualquier escena con "the"
+        y alguna palabra que empiece por "one"): las keywords de varias palabras se buscan como frase.
+        """
+        if len(keyword.split()) > 1:
+            return MatchPhrase(phrase=keyword)
+        return MatchText(text=keyword)
+
     def _create_document_from_point(self, point) -> Document:
         """Crea un objeto Document a partir de un Qdrant ScoredPoint o PointStruct."""
         metadata = point.payload.get("metadata", {}) if point.payload else {}
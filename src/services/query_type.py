@@ -0,0 +1,12 @@
+import re
+
+# Indicadores de consulta cuantitativa en una sola pasada ("how many times" queda cubierto por
+# "how many"). Sin \b: coinciden como subcadena, sin distinguir mayúsculas.
+_QUANT_RE = re.compile(r"how many|count|list all|find every", re.IGNORECASE)
+
+def get_query_type(query: str) -> str:
+    """
+    Clasifica la consulta como 'QUANTITATIVE' o 'QUALITATIVE'. Es el único criterio: la estrategia
+    de recuperación (RAGService) y la de generación deben coincidir siempre.
+    """
+    return 'QUANTITATIVE' if _QUANT_RE.search(query) else 'QUALITATIVE'
@@ -1,8 +1,13 @@
+import asyncio
 import logging
 from src.services.document_loader_service import DocumentLoaderService
 from src.services.qdrant_retriever_service import QdrantRetrieverService
+from src.services.query_type import get_query_type
 from src.api.schemas import RetrievedDoc
 
+async def _no_documents() -> list:
+    return []
+
 class RAGService:
     def __init__(self, loader: DocumentLoaderService, retriever: QdrantRetrieverService, generator):
         self.logger = logging.getLogger("uvicorn")
@@ -28,17 +33,16 @@ class RAGService:
             raise
 
     def _get_query_type(self, query: str) -> str:
-        query_lower = query.lower()
-        quantitative_indicators = ["how many times", "how many", "count", "list all", "find every"]
-        if any(indicator in query_lower for indicator in quantitative_indicators):
-            return 'QUANTITATIVE'
-        return 'QUALITATIVE'
+        return get_query_type(query)
 
     async def query(self, question: str, top_k: int = 10, attach_documents: bool = True):
         self.logger.info(f"--- Iniciando nueva consulta: '{question}' ---")
         try:
             query_type = self._get_query_type(question)
             retrieved_docs = []
+            keywords = None
+            character = None
+            query_embedding = None
 
             if query_type == 'QUANTITATIVE':
                 self.logger.info("[Strategy] QUANTITATIVE: Extracting entities...")
@@ -47,33 +51,63 @@ class RAGService:
                 
                 must_conditions = []
                 if hasattr(entities, 'character') and entities.character:
-                    must_conditions.append({'key': 'characters', 'value': entities.character.upper()})
+                    character = entities.character
+                    must_conditions.append({'key': 'characters', 'value': character.upper()})
                 keywords = getattr(entities, 'keywords', [])
 
                 # --- ESTRATEGIA DE FALLBACK CUANTITATIVA ---
+                # Los tres intentos se lanzan a la vez sobre el cliente asíncrono y se elige el primero
+                # no vacío por orden de prioridad: la latencia es la del más lento y no la suma de los tres.
                 # Intento A: Alta precisión (personaje + keywords)
                 self.logger.info(f"[Quantitative Fallback A] Searching with character filter and keywords: {keywords}")
-                retrieved_docs = self.retriever.filter_retrieve(must_conditions=must_conditions, query_text=keywords)
-
-                # Intento B: Si A falla, buscar solo por personaje (si existe)
-                if not retrieved_docs and must_conditions:
-                    self.logger.info("[Quantitative Fallback B] Attempt A failed. Searching with character filter only.")
-                    retrieved_docs = self.retriever.filter_retrieve(must_conditions=must_conditions, query_text="")
-
-                # Intento C: Si todo lo anterior falla, hacer una búsqueda semántica general
-                if not retrieved_docs:
-                    self.logger.info("[Quantitative Fallback C] Attempts A & B failed. Performing general semantic search.")
-                    retrieved_docs = self.retriever.retrieve(question, top_k=top_k)
+                attempt_a = self.retriever.filter_retrieve(must_conditions=must_conditions, query_text=keywords)
+                # Intento B: Solo por personaje (si existe)
+                attempt_b = (
+                    self.retriever.filter_retrieve(must_conditions=must_conditions, query_text="")
+                    if must_conditions else _no_documents()
+                )
+                # Intento C: Búsqueda semántica general
+                attempt_c = self.retriever.retrieve(question, top_k=top_k)
+                # Un intento fallido sólo aborta la consulta si es el que se habría elegido: un error de la
+                # búsqueda semántica no afecta a una consulta que el Intento A ya resuelve
+                results = await asyncio.gather(attempt_a, attempt_b, attempt_c, return_exceptions=True)
+                fallback_logs = {
+                    1: "[Quantitative Fallback B] Attempt A failed. Using character filter only.",
+                    2: "[Quantitative Fallback C] Attempts A & B failed. Using general semantic search.",
+                }
+                for position, result in enumerate(results):
+                    is_last = position == len(results) - 1
+                    if not isinstance(result, BaseException) and not result and not is_last:
+                        continue
+                    if position in fallback_logs:
+                        self.logger.info(fallback_logs[position])
+                    if isinstance(result, BaseException):
+                        raise result
+                    retrieved_docs = result
+                    break
             else:
                 self.logger.info("[Strategy] QUALITATIVE: Similarity search.")
-                retrieved_docs = self.retriever.retrieve(question, top_k=top_k)
+                retrieved_docs = await self.retriever.retrieve(question, top_k=top_k)
+                # Ya calculado por la recuperación: sale de la caché LRU del retriever
+                query_embedding = await self.retriever.embed_query(question)
 
-            # La deduplicación ahora se basa en el page_content de los objetos Document
-            unique_docs = list({doc.page_content: doc for doc in retrieved_docs}.values())
+            # Deduplicación por ID de Qdrant (corto y único): no se hashea el contenido completo
+            seen_ids = set()
+            unique_docs = []
+            for doc in retrieved_docs:
+                doc_key = doc.metadata.get("qdrant_id") or id(doc)
+                if doc_key in seen_ids:
+                    continue
+                seen_ids.add(doc_key)
+                unique_docs.append(doc)
             self.logger.info(f"Contexto final: {len(unique_docs)} documentos únicos para el generador.")
             
             # El generador recibe objetos Document y devuelve un objeto MatrixResponse
-            result = await self.generator.generate_response(question, unique_docs)
+            # Las entidades extraídas permiten al generador resolver sin LLM los conteos triviales a 0
+            # y reutilizar la evidencia de un plan ya ejecutado; el embedding alimenta su caché semántica
+            result = await self.generator.generate_response(
+                question, unique_docs, keywords=keywords, character=character, query_embedding=query_embedding
+            )
             result_data = result.model_dump()
 
             # --- MEJORA DE FIABILIDAD: Rellenar campos si el LLM no lo hizo ---
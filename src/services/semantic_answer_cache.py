@@ -0,0 +1,54 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional
+
+import numpy as np
+
+from src.services.vector_utils import normalize_embedding
+
+
+class SemanticAnswerCache:
+    """
+    Caché en memoria de respuestas indexada por (embedding de la consulta, hash del contexto).
+    Una respuesta sólo se reutiliza si el contexto recuperado es exactamente el mismo y la
+    consulta es semánticamente equivalente (similitud coseno >= threshold).
+    """
+
+    def __init__(self, threshold: float = 0.92, max_contexts: int = 256, max_per_context: int = 32):
+        self.threshold = threshold
+        self.max_contexts = max_contexts
+        self.max_per_context = max_per_context
+        # hash de contexto -> [(embedding normalizado, respuesta serializada)]
+        self._entries: "OrderedDict[str, List[tuple[np.ndarray, dict]]]" = OrderedDict()
+
+    @staticmethod
+    def context_hash(scene_numbers: Iterable[Any]) -> str:
+        """Hash estable del conjunto de escenas usado como contexto."""
+        key = "\x1f".join(sorted(str(n) for n in scene_numbers))
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get(self, embedding: List[float], ctx_hash: str) -> Optional[dict]:
+        entries = self._entries.get(ctx_hash)
+        if not entries:
+            return None
+        self._entries.move_to_end(ctx_hash)
+        query = normalize_embedding(embedding)
+        # Búsqueda exhaustiva: sólo se comparan consultas hechas sobre el mismo contexto
+        scores = np.stack([vector for vector, _ in entries]) @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return entries[best][1]
+
+    def put(self, embedding: List[float], ctx_hash: str, response: dict) -> None:
+        entries = self._entries.setdefault(ctx_hash, [])
+        entries.append((normalize_embedding(embedding), response))
+        if len(entries) > self.max_per_context:
+            del entries[0]
+        self._entries.move_to_end(ctx_hash)
+        # Se descartan los contextos usados hace más tiempo
+        while len(self._entries) > self.max_contexts:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -0,0 +1,56 @@
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+import numpy as np
+
+from src.services.vector_utils import normalize_embedding
+
+
+class SemanticResultCache:
+    """
+    Caché LRU de resultados de búsqueda indexada por el embedding de la consulta. Los embeddings
+    normalizados forman una matriz con una fila por entrada, que se actualiza al insertar y al
+    desalojar: cada consulta se resuelve con un único producto matriz-vector. Sólo se reutiliza
+    un resultado buscado con el mismo top_k y con similitud coseno >= threshold.
+    """
+
+    def __init__(self, threshold: float = 0.95, capacity: int = 256):
+        self.threshold = threshold
+        self.capacity = capacity
+        # (capacity, dims): se reserva con la primera entrada, cuando se conoce la dimensión
+        self._matrix: Optional[np.ndarray] = None
+        # top_k de cada fila; -1 marca las filas libres
+        self._top_k = np.full(capacity, -1, dtype=np.int64)
+        self._values: List[Any] = [None] * capacity
+        # Filas ocupadas, de la usada hace más tiempo a la más reciente
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._free_rows = list(range(capacity - 1, -1, -1))
+
+    def get(self, embedding: List[float], top_k: int) -> Optional[Any]:
+        if not self._lru:
+            return None
+        scores = self._matrix @ normalize_embedding(embedding)
+        # Filas libres o buscadas con otro top_k no son comparables
+        scores[self._top_k != top_k] = -np.inf
+        row = int(np.argmax(scores))
+        if scores[row] < self.threshold:
+            return None
+        self._lru.move_to_end(row)
+        return self._values[row]
+
+    def put(self, embedding: List[float], top_k: int, value: Any) -> None:
+        vector = normalize_embedding(embedding)
+        if self._matrix is None:
+            self._matrix = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+        # Sin filas libres se reutiliza la de la entrada usada hace más tiempo
+        row = self._free_rows.pop() if self._free_rows else self._lru.popitem(last=False)[0]
+        self._matrix[row] = vector
+        self._top_k[row] = top_k
+        self._values[row] = value
+        self._lru[row] = None
+
+    def clear(self) -> None:
+        self._top_k.fill(-1)
+        self._values = [None] * self.capacity
+        self._lru.clear()
+        self._free_rows = list(range(self.capacity - 1, -1, -1))
@@ -0,0 +1,10 @@
+from typing import List
+
+import numpy as np
+
+
+def normalize_embedding(embedding: List[float]) -> np.ndarray:
+    """Embedding en float32 con norma 1: el producto escalar pasa a ser la similitud coseno."""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -10,12 +10,32 @@ from dotenv import load_dotenv
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 load_dotenv(dotenv_path=BASE_DIR / ".env")
 
+# Peticiones de embeddings simultáneas que admite cada tier de uso de OpenAI sin recibir 429
+_EMBEDDING_CONCURRENCY_BY_TIER = {"tier1": 35, "tier2": 60, "tier4": 125}
+
 class Settings:
     # Qdrant (hardcodeado)
     QDRANT_HOST: str = "localhost"
     QDRANT_PORT: int = 6333
+    # Puerto gRPC: las consultas usan el cliente asíncrono sobre gRPC
+    QDRANT_GRPC_PORT: int = 6334
     QDRANT_COLLECTION: str = "matrix_collection"
     QDRANT_EMBEDDING_DIMS: int = 256  # text-embedding-3-large (coincide con el ejemplo)
+    # Candidatos explorados en el HNSW por búsqueda: más recall a cambio de latencia
+    QDRANT_HNSW_EF: int = int(os.getenv("QDRANT_HNSW_EF", "64"))
+    # Indexado: documentos por llamada de embeddings/upsert y lotes embebidos en paralelo
+    INDEX_BATCH_SIZE: int = 128
+    OPENAI_TIER: str = os.getenv("OPENAI_TIER", "tier1")
+    # Límite de llamadas simultáneas a la API de embeddings (indexado y consultas)
+    EMBEDDING_MAX_CONCURRENCY: int = _EMBEDDING_CONCURRENCY_BY_TIER.get(OPENAI_TIER, 35)
+    # Embeddings de consultas conservados en memoria (LRU)
+    EMBEDDING_CACHE_SIZE: int = 1024
+    # Caché semántica de resultados de búsqueda: similitud mínima y consultas conservadas
+    RETRIEVAL_CACHE_THRESHOLD: float = 0.95
+    RETRIEVAL_CACHE_SIZE: int = 256
+    # Búsqueda filtrada: puntos por página de scroll y máximo de documentos devueltos
+    FILTER_SCROLL_PAGE_SIZE: int = 256
+    FILTER_MAX_RESULTS: int = 1000
 
     # OpenAI (solo la API key es sensible)
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
@@ -23,9 +43,23 @@ class Settings:
     OPENAI_PYDANTIC_MODEL: str = "openai:gpt-4.1-nano"  # gpt-4.1-nano
     # Para LangChain/OpenAI (solo el nombre del modelo)
     OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-large"
+    # Máximo de llamadas simultáneas al LLM en el conteo map-reduce
+    MATRIX_MAX_CONCURRENCY: int = int(os.getenv("MATRIX_MAX_CONC", "8"))
+    # Documentos por llamada al agente de conteo
+    COUNTING_BATCH_SIZE: int = 10
+    # Por debajo de este tamaño (en caracteres, ~3k tokens) el conteo se hace en una sola llamada
+    SMALL_CONTEXT_CHARS: int = 12_000
+    # Planes de conteo (entidades + contexto) cuya evidencia se conserva en memoria
+    PLAN_CACHE_SIZE: int = 1024
 
     # Documentos
     MATRIX_SCRIPT_PATH: str = "resources/movie-scripts/the-matrix-1999.pdf"
+    # Caché en disco de las escenas parseadas (vacío para desactivarla)
+    SCENES_CACHE_DIR: str = "resources/cache"
+
+    # Caché semántica de respuestas cualitativas
+    ANSWER_CACHE_THRESHOLD: float = 0.92  # similitud coseno mínima para reutilizar una respuesta
+    ANSWER_CACHE_MAX_CONTEXTS: int = 256
 
     # Otros
     DEBUG: bool = False
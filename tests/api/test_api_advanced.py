@@ -12,18 +12,18 @@ ADVANCED_QUERIES = [
 
 RESPONSE_FILE = os.path.join(os.path.dirname(__file__), '../../response_tests.json')
 
-def append_response_to_file(question, response):
-    try:
-        if os.path.exists(RESPONSE_FILE):
-            with open(RESPONSE_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        else:
-            data = []
-    except Exception:
-        data = []
-    data.append({"question": question, "response": response})
+# Las respuestas se acumulan en memoria y el fichero se escribe una sola vez al final del módulo,
+# en lugar de releerlo y reescribirlo entero en cada test
+_responses = []
+
+@pytest.fixture(scope="module", autouse=True)
+def write_response_file():
+    yield
     with open(RESPONSE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+        json.dump(_responses, f, ensure_ascii=False, indent=2)
+
+def append_response_to_file(question, response):
+    _responses.append({"question": question, "response": response})
 
 @pytest.mark.parametrize("complex_question", ADVANCED_QUERIES)
 def test_advanced_matrix_qa(client, complex_question):
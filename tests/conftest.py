@@ -3,6 +3,7 @@ from fastapi.testclient import TestClient
 from src.api.main import app
 import os
 import json
+import time
 
 @pytest.fixture(scope="session", autouse=True)
 def clean_response_tests():
@@ -23,4 +24,7 @@ def client():
     Úsalo pasando `client` como argumento en tus tests.
     """
     with TestClient(app) as test_client:
+        # La indexación corre en segundo plano: esperamos a que termine antes de consultar
+        while not app.state.index_task.done():
+            time.sleep(0.5)
         yield test_client
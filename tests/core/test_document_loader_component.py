@@ -0,0 +1,63 @@
+import logging
+from unittest.mock import MagicMock
+from src.services.implementations.matrix_document_loader_service import MatrixDocumentLoaderService
+
+def _line(text, text_type, page_number=1):
+    return {"text": text, "metadata": {"text_type": text_type, "page_number": page_number}}
+
+def _make_service(lines):
+    svc = MatrixDocumentLoaderService.__new__(MatrixDocumentLoaderService)
+    svc.logger = logging.getLogger("test")
+    svc.cache_dir = ""
+    svc.loader = MagicMock()
+    svc.loader.lazy_load.return_value = iter(lines)
+    return svc
+
+def test_scenes_are_split_on_location_lines():
+    svc = _make_service([
+        _line("Title page", "description"),
+        _line("INT. HOTEL - NIGHT", "location"),
+        _line("TRINITY", "character"),
+        _line("Is everything in place?", "dialog"),
+        _line("INT. HOTEL - NIGHT", "location", page_number=2),
+        _line("Agents enter the room.", "description", page_number=2),
+        _line("Neo wakes up.", "description", page_number=3),
+    ])
+    chunks = svc.load_documents()
+
+    assert len(chunks) == 2
+    assert chunks[0]["page_content"] == "Location: INT. HOTEL - NIGHT\nTRINITY: Is everything in place?"
+    assert chunks[0]["metadata"]["scene_number"] == 1
+    assert chunks[0]["metadata"]["characters"] == ["TRINITY"]
+    assert chunks[1]["metadata"]["scene_number"] == 2
+    assert chunks[1]["metadata"]["page_start"] == 2
+    assert chunks[1]["metadata"]["page_end"] == 3
+
+def test_empty_scenes_keep_scene_numbering():
+    svc = _make_service([
+        _line("INT. HOTEL - NIGHT", "location"),
+        _line("EXT. ROOFTOP - NIGHT", "location"),
+        _line("Trinity runs.", "description"),
+    ])
+    chunks = svc.load_documents()
+
+    assert len(chunks) == 1
+    assert chunks[0]["metadata"]["scene_number"] == 2
+    assert chunks[0]["metadata"]["location"] == "EXT. ROOFTOP - NIGHT"
+
+def test_scene_chunks_are_cached_on_disk(tmp_path):
+    source = tmp_path / "script.pdf"
+    source.write_bytes(b"%PDF-fake")
+    svc = _make_service([
+        _line("INT. HOTEL - NIGHT", "location"),
+        _line("Trinity runs.", "description"),
+    ])
+    svc.source_path = str(source)
+    svc.cache_dir = str(tmp_path / "cache")
+
+    first = svc.load_documents()
+    svc.loader.lazy_load.side_effect = AssertionError("el guion no debería volver a parsearse")
+    second = svc.load_documents()
+
+    assert second == first
+    assert len(list((tmp_path / "cache").glob("matrix_scenes_*.json"))) == 1
@@ -0,0 +1,70 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from langchain_core.documents import Document
+from src.services.implementations.matrix_generator_service import MatrixGeneratorService, QuantitativeAnalysis
+
+QUERY = "How many times does Morpheus say 'the One'?"
+
+@pytest.fixture
+def generator(monkeypatch):
+    # Los agentes no llaman a OpenAI: el agente de conteo se sustituye por un stub
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    svc = MatrixGeneratorService()
+    svc.counting_agent = SimpleNamespace(run=AsyncMock(return_value=SimpleNamespace(
+        output=QuantitativeAnalysis(evidence=["MORPHEUS: You are the One, Neo."])
+    )))
+    return svc
+
+def _scene(text: str, scene_number: int = 1) -> Document:
+    return Document(page_content=text, metadata={"scene_number": scene_number, "location": "ROOM"})
+
+@pytest.mark.asyncio
+async def test_quantitative_query_with_absent_keywords_skips_the_agent(generator):
+    context = [_scene("NEO: Whoa.")]
+
+    response = await generator.generate_response(QUERY, context, keywords=["the One"], character="Morpheus")
+
+    assert "0 occurrences" in response.answer
+    generator.counting_agent.run.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_quantitative_query_with_present_keyword_reaches_the_agent(generator):
+    context = [_scene("MORPHEUS: You are the One, Neo.")]
+
+    response = await generator.generate_response(QUERY, context, keywords=["the one"], character="Morpheus")
+
+    assert "final count is 1" in response.answer
+    generator.counting_agent.run.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_plan_cache_reuses_evidence_for_same_entities_and_context(generator):
+    context = [_scene("MORPHEUS: You are the One, Neo.")]
+    await generator.generate_response(QUERY, context, keywords=["the One"], character="Morpheus")
+
+    # Otra redacción con las mismas entidades sobre el mismo contexto no vuelve a llamar al agente
+    response = await generator.generate_response(
+        "Count how often Morpheus mentions 'the One'", context, keywords=["the One"], character="MORPHEUS"
+    )
+    assert "final count is 1" in response.answer
+    assert generator.counting_agent.run.await_count == 1
+
+    # El mismo plan sobre un contexto distinto es un fallo de caché
+    other_context = context + [_scene("MORPHEUS: He is the One.", scene_number=2)]
+    await generator.generate_response(QUERY, other_context, keywords=["the One"], character="Morpheus")
+    assert generator.counting_agent.run.await_count == 2
+
+@pytest.mark.asyncio
+async def test_plan_cache_evicts_least_recent_plan(generator, monkeypatch):
+    from src.settings.config import settings
+    monkeypatch.setattr(settings, "PLAN_CACHE_SIZE", 2)
+    contexts = [[_scene(f"MORPHEUS: You are the One, Neo. ({i})", scene_number=i)] for i in range(3)]
+    for context in contexts:
+        await generator.generate_response(QUERY, context, keywords=["the One"], character="Morpheus")
+    assert len(generator._plan_cache) == 2
+
+    # El plan más reciente sigue en caché; el primero se descartó al superar el tamaño
+    await generator.generate_response(QUERY, contexts[2], keywords=["the One"], character="Morpheus")
+    assert generator.counting_agent.run.await_count == 3
+    await generator.generate_response(QUERY, contexts[0], keywords=["the One"], character="Morpheus")
+    assert generator.counting_agent.run.await_count == 4
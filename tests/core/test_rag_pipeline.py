@@ -23,7 +23,8 @@ class RagPipelineSuite:
     @pytest.fixture
     def fake_retriever_with_docs(self, doc_samples):
         retriever = MagicMock()
-        retriever.retrieve.return_value = doc_samples
+        retriever.retrieve = AsyncMock(return_value=doc_samples)
+        retriever.embed_query = AsyncMock(return_value=[0.1, 0.2])
         retriever.keyword_search.return_value = doc_samples
         return retriever
 
@@ -73,3 +74,30 @@ class RagPipelineSuite:
         assert result["answer"] == "Pipeline response"
         assert result["confidence"] == 0.99
         assert result.get("retrieved_documents") is not None
+
+@pytest.mark.asyncio
+async def test_quantitative_query_ignores_failed_semantic_fallback():
+    from types import SimpleNamespace
+    from langchain_core.documents import Document
+
+    scene = Document(page_content="NEO: Whoa.", metadata={"qdrant_id": "1"})
+    retriever = MagicMock()
+    retriever.filter_retrieve = AsyncMock(return_value=[scene])
+    retriever.retrieve = AsyncMock(side_effect=RuntimeError("429 Too Many Requests"))
+    generator = MagicMock()
+    generator.extraction_agent.run = AsyncMock(return_value=SimpleNamespace(
+        output=SimpleNamespace(character="Neo", keywords=["whoa"])
+    ))
+    generator.generate_response = AsyncMock(return_value=SimpleNamespace(
+        model_dump=lambda: {"answer": "1", "sources_used": ["Scene 1"], "reasoning": "count"}
+    ))
+    rag = RAGService(loader=MagicMock(), retriever=retriever, generator=generator)
+
+    # El Intento A ya tiene documentos: el fallo del Intento C no llega a la respuesta
+    await rag.query("How many times does Neo say whoa?", attach_documents=False)
+    assert generator.generate_response.await_args.args[1] == [scene]
+
+    # Si A y B quedan vacíos, el intento elegido es C y su error sí se propaga
+    retriever.filter_retrieve = AsyncMock(return_value=[])
+    with pytest.raises(RuntimeError):
+        await rag.query("How many times does Neo say whoa?", attach_documents=False)
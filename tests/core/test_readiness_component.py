@@ -0,0 +1,26 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.api.routers import agent_router
+
+def test_health_reports_readiness_and_index_failure():
+    # App mínima sin lifespan: el estado de la indexación se fija a mano
+    app = FastAPI()
+    app.include_router(agent_router)
+    client = TestClient(app)
+
+    app.state.ready = False
+    app.state.index_error = None
+    response = client.get("/health")
+    assert response.status_code == 503
+    assert response.json()["detail"] == "La indexación de documentos está en curso."
+
+    app.state.index_error = "Qdrant no responde"
+    response = client.get("/health")
+    assert response.status_code == 503
+    assert response.json()["detail"] == "La indexación falló: Qdrant no responde"
+
+    app.state.index_error = None
+    app.state.ready = True
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
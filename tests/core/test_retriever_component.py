@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import MagicMock, patch
 
@@ -41,3 +42,62 @@ def test_retriever_init_error(monkeypatch, caplog):
     with pytest.raises(Exception):
         qdrant_retriever_service.QdrantRetrieverService()
     assert "Error inicializando QdrantRetrieverService" in caplog.text
+
+@pytest.mark.asyncio
+async def test_filter_retrieve_matches_multiword_keywords_as_phrases():
+    import logging
+    from qdrant_client import AsyncQdrantClient
+    from qdrant_client.http.models import Distance, PointStruct, VectorParams
+    from src.services import qdrant_retriever_service
+
+    scenes = [
+        "MORPHEUS: You are the One, Neo.",
+        "NEO: The Oracle told me one thing.",
+        "TRINITY: He is the one they talked about.",
+        "CYPHER: Nobody is special.",
+    ]
+    svc = qdrant_retriever_service.QdrantRetrieverService.__new__(qdrant_retriever_service.QdrantRetrieverService)
+    svc.logger = logging.getLogger("test")
+    svc.collection_name = "test_phrases"
+    svc._initialized = False
+    svc.async_client = AsyncQdrantClient(location=":memory:")
+    await svc.async_client.create_collection(svc.collection_name, vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+    await svc.async_client.upsert(svc.collection_name, points=[
+        PointStruct(id=i, vector=[1.0, 0.0], payload={"page_content": text, "metadata": {}})
+        for i, text in enumerate(scenes)
+    ])
+
+    docs = await svc.filter_retrieve(must_conditions=[], query_text=["the One"])
+
+    # Mismo resultado que la comprobación por subcadena original (sin distinguir mayúsculas)
+    assert sorted(doc.page_content for doc in docs) == sorted(text for text in scenes if "the one" in text.lower())
+
+@pytest.mark.asyncio
+async def test_is_initialized_detects_populated_collection():
+    import logging
+    from qdrant_client import AsyncQdrantClient, QdrantClient
+    from qdrant_client.http.models import Distance, PointStruct, VectorParams
+    from src.services import qdrant_retriever_service
+
+    svc = qdrant_retriever_service.QdrantRetrieverService.__new__(qdrant_retriever_service.QdrantRetrieverService)
+    svc.logger = logging.getLogger("test")
+    svc.collection_name = "test_initialized"
+    svc._initialized = False
+    svc.client = QdrantClient(location=":memory:")
+    svc.async_client = AsyncQdrantClient(location=":memory:")
+    for client in (svc.client, svc.async_client):
+        result = client.create_collection(svc.collection_name, vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+        if asyncio.iscoroutine(result):
+            await result
+
+    # Una colección vacía no se da por inicializada
+    assert svc.is_initialized() is False
+    assert await svc.ais_initialized() is False
+
+    point = PointStruct(id=1, vector=[1.0, 0.0], payload={"page_content": "NEO: Whoa.", "metadata": {}})
+    svc.client.upsert(svc.collection_name, points=[point])
+    assert svc.is_initialized() is True
+
+    svc._initialized = False
+    await svc.async_client.upsert(svc.collection_name, points=[point])
+    assert await svc.ais_initialized() is True
@@ -0,0 +1,56 @@
+import os
+import pytest
+import regex
+from kbac.loaders.matrix_script_loader import MatrixScriptLoader, _match_location
+
+SCRIPT_PATH = os.path.join(os.path.dirname(__file__), "../../resources/movie-scripts/the-matrix-1999.pdf")
+
+# Patrón original de ubicaciones: _match_location debe comportarse igual
+LOCATION_PATTERN = regex.compile(r"([AB]?\d+\s{2,})(.*?)(\s{2,}[AB]?\d+$)")
+
+@pytest.mark.parametrize("line_text", [
+    "5       EXT. HEART O' THE CITY HOTEL                                            5",
+    "A12      INT. NEBUCHADNEZZAR - CORE                              A12",
+    "4       CONTINUED:  4",
+    "5    5",
+    "5   5",
+    "5  INT. ROOM 5",
+    "ADAM  INT. ROOM  5",
+    "       A flashlight rocks slowly to a stop.",
+    "12      INT. HALLWAY  B",
+    "",
+])
+def test_match_location_is_equivalent_to_regex(line_text):
+    match_ = LOCATION_PATTERN.match(line_text)
+    expected = None if match_ is None else (match_.group(2).strip(), len(match_.group(1)))
+    result = _match_location(line_text)
+    assert (None if result is None else (result[0].strip(), result[1])) == expected
+
+def test_parse_page_line_classifies_by_margin():
+    loader = MatrixScriptLoader(source_path="unused.pdf", backend="pypdf")
+    location = loader._parse_page_line("5       EXT. HEART O' THE CITY HOTEL              5", page_number=3)
+    character = loader._parse_page_line(" " * 38 + "MORPHEUS (V.O.)", page_number=3)
+    dialog = loader._parse_page_line(" " * 21 + "You have to focus.", page_number=3)
+    description = loader._parse_page_line(" " * 8 + "She takes a deep breath.", page_number=3)
+
+    assert (location.text_type, location.text, location.margin) == ("location", "EXT. HEART O' THE CITY HOTEL", 8)
+    assert (character.text_type, character.text) == ("character", "MORPHEUS")
+    assert (dialog.text_type, dialog.text) == ("dialog", "You have to focus.")
+    assert (description.text_type, description.text) == ("description", "She takes a deep breath.")
+    assert loader._parse_page_line(" " * 8 + "CONTINUED:", page_number=3) is None
+
+@pytest.mark.parametrize("page_index", [14, 122])
+def test_pymupdf_layout_matches_pypdf(page_index):
+    # Páginas con espacios de no separación: PyMuPDF no debe introducir "!" ni desplazar columnas
+    pytest.importorskip("pymupdf")
+    lines = {
+        backend: [
+            (doc["metadata"]["text_type"], doc["text"])
+            for doc in MatrixScriptLoader(
+                source_path=SCRIPT_PATH, backend=backend, start_page=page_index, end_page=page_index, n_workers=1
+            ).lazy_load()
+        ]
+        for backend in ("pypdf", "pymupdf")
+    }
+    assert lines["pymupdf"] == lines["pypdf"]
+    assert not any("/nobreakspace" in text or " ! " in text for _, text in lines["pymupdf"])
@@ -0,0 +1,34 @@
+from src.services.semantic_answer_cache import SemanticAnswerCache
+from src.services.semantic_result_cache import SemanticResultCache
+
+def test_semantic_cache_requires_same_context_and_similar_query():
+    cache = SemanticAnswerCache(threshold=0.92)
+    ctx_hash = SemanticAnswerCache.context_hash([3, 1, 2])
+    cache.put([1.0, 0.0, 0.0], ctx_hash, {"answer": "Neo is the One."})
+
+    # El orden de las escenas no altera el hash del contexto
+    assert cache.get([0.99, 0.05, 0.0], SemanticAnswerCache.context_hash([1, 2, 3])) == {"answer": "Neo is the One."}
+    assert cache.get([0.0, 1.0, 0.0], ctx_hash) is None
+    assert cache.get([1.0, 0.0, 0.0], SemanticAnswerCache.context_hash([1, 2])) is None
+
+def test_semantic_cache_evicts_least_recent_context():
+    cache = SemanticAnswerCache(max_contexts=1)
+    cache.put([1.0, 0.0], "a", {"answer": "a"})
+    cache.put([1.0, 0.0], "b", {"answer": "b"})
+
+    assert cache.get([1.0, 0.0], "a") is None
+    assert cache.get([1.0, 0.0], "b") == {"answer": "b"}
+
+def test_result_cache_is_scoped_by_top_k_and_reuses_evicted_rows():
+    cache = SemanticResultCache(threshold=0.95, capacity=2)
+    cache.put([1.0, 0.0], 10, ["neo"])
+    cache.put([0.0, 1.0], 10, ["trinity"])
+
+    assert cache.get([0.99, 0.05], 10) == ["neo"]
+    assert cache.get([1.0, 0.0], 5) is None
+
+    # "trinity" es la entrada usada hace más tiempo: su fila pasa a la nueva entrada
+    cache.put([0.7, 0.7], 10, ["morpheus"])
+    assert cache.get([0.0, 1.0], 10) is None
+    assert cache.get([0.7, 0.7], 10) == ["morpheus"]
+    assert cache.get([1.0, 0.0], 10) == ["neo"]